@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+from __future__ import division, print_function
+
+import io
+import os
+import re
+import threading
+
+from armory.utils import _ENV_ERROR_MSG, boolean
+from armory.utils.builtins import items
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+_DOTENV_LINE = re.compile(
+    r'^(?:export\s+)?([A-Za-z_][A-Za-z0-9_.]*)\s*=\s*(.*)$')
+# a quoted value, optionally followed by a comment
+_DOTENV_QUOTED = re.compile(
+    r'''^(?:'([^']*)'|"((?:[^"\\]|\\.)*)")\s*(?:#.*)?$''')
+_DOTENV_ESCAPE = re.compile(r'\\(.)')
+_DOTENV_ESCAPES = {'n': '\n', 'r': '\r', 't': '\t'}
+_MISSING = object()
+_REGISTRY_SIZE = 1024
+
+
+class _Snapshot(object):
+    """Frozen values of one :meth:`Environment.reload`"""
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError('environment snapshots are read-only')
+
+    def __delattr__(self, name):
+        raise AttributeError('environment snapshots are read-only')
+
+    def __repr__(self):
+        values = []
+        for name in self.__slots__:
+            try:
+                values.append('{0}={1!r}'.format(name, getattr(self, name)))
+            except AttributeError:
+                continue
+        return '<Environment snapshot: {0}>'.format(', '.join(values))
+
+
+def _coercer(options):
+    coerce = options.get('coerce', None)
+    if coerce is bool:
+        boolmap = options.get('boolmap', None)
+        if boolmap is not None:
+            return lambda value: boolean(value, boolmap=boolmap)
+        return boolean
+    return coerce
+
+
+def _compile(name, options):
+    """Return a closure converting the raw value of ``name`` (or _MISSING)
+
+    Follows :func:`armory.utils.env`: defaults are returned as given unless
+    ``force`` is set and values are only coerced when not already of the
+    ``coerce`` type.
+    """
+    coerce = _coercer(options)
+    force = options.get('force', False)
+    required = 'default' not in options
+    default = options.get('default', None)
+    missing = _ENV_ERROR_MSG.format(name)
+    invalid = 'Environment variable "' + name + '": {0}'
+
+    def convert(value):
+        if value is _MISSING:
+            if required:
+                raise KeyError(missing)
+            if not force:
+                return default
+            value = default
+        if coerce is None or (not force and type(value) is coerce):
+            return value
+        try:
+            return coerce(value)
+        except (TypeError, ValueError) as e:
+            raise ValueError(invalid.format(e))
+    return convert
+
+
+def compile_schema(schema):
+    """Compile ``schema`` into ``[(name, convert), ...]`` once
+
+    ``schema`` maps variable names to the :class:`Environment` options
+    (``default``, ``coerce``, ``boolmap``, plus ``force`` and ``sticky``
+    as in :func:`armory.utils.env`); ``convert`` takes the raw value, or
+    the ``_MISSING`` sentinel, and raises KeyError or ValueError.
+    """
+    return [(name, _compile(name, options))
+            for name, options in items(schema)]
+
+
+def _unquote(value):
+    value = value.strip()
+    match = _DOTENV_QUOTED.match(value)
+    if match is not None:
+        single, double = match.groups()
+        if single is not None:
+            return single
+        return _DOTENV_ESCAPE.sub(
+            lambda m: _DOTENV_ESCAPES.get(m.group(1), m.group(1)), double)
+    # unquoted values may carry a trailing comment
+    return value.split(' #', 1)[0].rstrip()
+
+
+def read_dotenv(path):
+    """Parse the ``KEY=value`` lines of a ``.env`` file into a dict
+
+    Blank lines, ``#`` comments (also after a value) and an ``export``
+    prefix are ignored; values may be single quoted (literal) or double
+    quoted (with ``\\n``, ``\\t`` and ``\\"`` style escapes).
+    """
+    values = {}
+    with io.open(path, encoding='utf-8') as fp:
+        for number, line in enumerate(fp, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            match = _DOTENV_LINE.match(line)
+            if match is None:
+                raise ValueError('{0}:{1}: not a KEY=value line'.format(
+                    path, number))
+            values[match.group(1)] = _unquote(match.group(2))
+    return values
+
+
+def load_env(schema, source=None, sticky=False):
+    """Read every variable in ``schema`` in one pass
+
+    ``schema`` is a dict as for :func:`compile_schema` or its compiled
+    list; ``source`` is a mapping, the path of a ``.env`` file or None for
+    ``os.environ``. Returns ``(values, errors)`` where ``errors`` maps each
+    missing or invalid variable to its KeyError or ValueError, so every
+    problem can be reported at once.
+
+    Defaults used for variables marked ``sticky`` (or all of them when
+    ``sticky`` is True) are exported with a single ``os.environ.update`` so
+    child processes inherit them; None defaults are not exported.
+    """
+    if isinstance(schema, dict):
+        options = schema
+        loaders = compile_schema(schema)
+    else:
+        options = {}
+        loaders = schema
+    if source is None:
+        source = os.environ
+    elif not hasattr(source, 'get'):
+        source = read_dotenv(source)
+    values = {}
+    errors = {}
+    exported = {}
+    for name, convert in loaders:
+        raw = source.get(name, _MISSING)
+        try:
+            values[name] = convert(raw)
+        except (KeyError, ValueError) as e:
+            errors[name] = e
+            continue
+        if raw is _MISSING and name not in os.environ:
+            if sticky or options.get(name, {}).get('sticky', False):
+                default = options.get(name, {}).get('default', values[name])
+                if default is not None:
+                    exported[name] = '{0}'.format(default)
+    if exported:
+        os.environ.update(exported)
+    return values, errors
+
+
+def _env_converter(default, cast, force, boolmap):
+    """Return the conversion :func:`armory.utils.env` applies to a value"""
+    coerce = _coercer({
+        'coerce': cast,
+        'boolmap': None if boolmap is None else dict(boolmap),
+    })
+
+    def convert(value):
+        if force or (value != default and type(value) != cast):
+            return coerce(value)
+        return value
+    return convert
+
+
+class EnvRegistry(object):
+    """Cached conversions backing :func:`armory.utils.env`
+
+    Remembers, per variable, the options of the last call, the value it
+    converted and the result, so calls made while a variable and its
+    options are unchanged return the cached result instead of casting
+    again. Values are still read from the environment by the caller on
+    every call, so changes are seen immediately; cast results are shared
+    between calls like :class:`Environment` values.
+    """
+    def __init__(self, maxsize=_REGISTRY_SIZE):
+        self.maxsize = maxsize
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def convert(self, key, value, default, cast, force=False, boolmap=None):
+        """Return ``value`` (read for ``key``) converted like ``env``"""
+        entry = self._entries.get(key)
+        # options by identity, the value by equality and type so 1 and
+        # True do not share a result
+        if (entry is not None and entry[0] is default and entry[1] is cast
+                and entry[2] is force and entry[3] == boolmap
+                and entry[4] == value and type(entry[4]) is type(value)):
+            self.hits += 1
+            return entry[5]
+        self.misses += 1
+        if boolmap is not None:
+            boolmap = dict(boolmap)
+        result = _env_converter(default, cast, force, boolmap)(value)
+        entries = self._entries
+        if len(entries) >= self.maxsize and key not in entries:
+            entries.clear()
+        # one assignment, so concurrent callers never see a torn entry
+        entries[key] = (default, cast, force, boolmap, value, result)
+        return result
+
+    def clear(self):
+        self._entries.clear()
+
+
+ENV_REGISTRY = EnvRegistry()
+
+
+class Environment(object):
+    """Typed environment variables read and coerced once per :meth:`reload`
+
+    ``spec`` maps variable names to options: ``default`` (the variable is
+    required without one) and ``coerce``, a callable applied to values
+    read from the environment (``bool`` uses :func:`armory.utils.boolean`
+    with the optional ``boolmap``). Defaults are used as given unless
+    ``force`` is set, like :func:`armory.utils.env`.
+
+    Every variable is read, coerced and validated up front into a frozen,
+    slot-backed snapshot, so ``env('HOME')`` or ``env.HOME`` costs little
+    more than an attribute access. Accessing a variable that was missing
+    raises KeyError and one that could not be coerced raises ValueError;
+    all problems are also listed in :attr:`errors`. :meth:`reload`
+    re-reads the environment and swaps the snapshot together with its
+    errors in one assignment, so readers on other threads never see a
+    partial update.
+    """
+    def __init__(self, spec, environ=None):
+        names = tuple(spec)
+        invalid = [name for name in names if not _IDENTIFIER.match(name)]
+        if invalid:
+            raise ValueError('invalid environment variable names: {0}'.format(
+                ', '.join(sorted(invalid))))
+        self._spec = dict(spec)
+        self._environ = environ if environ is not None else os.environ
+        self._loaders = compile_schema(self._spec)
+        self._type = type(
+            str('EnvironmentSnapshot'), (_Snapshot,),
+            {'__slots__': names})
+        self._lock = threading.Lock()
+        # (raw values, snapshot, errors), swapped as one by reload()
+        self._state = None
+        self.version = 0
+        self.reload()
+
+    @property
+    def snapshot(self):
+        """The current read-only snapshot (attributes per variable)"""
+        return self._state[1]
+
+    @property
+    def errors(self):
+        """``{name: exception}`` for each missing or invalid variable"""
+        return dict(self._state[2])
+
+    def _read(self):
+        environ = self._environ
+        return dict(
+            (name, environ.get(name, _MISSING)) for name in self._spec
+        )
+
+    def _build(self, raw):
+        snapshot = self._type()
+        errors = {}
+        setter = object.__setattr__
+        for name, convert in self._loaders:
+            try:
+                setter(snapshot, name, convert(raw[name]))
+            except (KeyError, ValueError) as e:
+                errors[name] = e
+        return snapshot, errors
+
+    def reload(self):
+        """Re-read the environment; return the names whose value changed"""
+        with self._lock:
+            raw = self._read()
+            state = self._state
+            if state is not None and raw == state[0]:
+                return frozenset()
+            snapshot, errors = self._build(raw)
+            changed = frozenset(
+                name for name in self._spec
+                if state is None or raw[name] != state[0][name]
+            )
+            self._state = (raw, snapshot, errors)
+            self.version += 1
+        return changed
+
+    def changed(self):
+        """Names whose environment value differs from the snapshot"""
+        raw = self._read()
+        current = self._state[0]
+        return frozenset(
+            name for name in self._spec if raw[name] != current[name])
+
+    def __call__(self, name):
+        state = self._state
+        try:
+            return getattr(state[1], name)
+        except AttributeError:
+            error = state[2].get(name)
+            if error is None:
+                raise KeyError(
+                    'Environment variable "{0}" is not in the spec'.format(
+                        name))
+            raise error
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self(name)
+        except KeyError as e:
+            raise AttributeError(e)
+
+    def __contains__(self, name):
+        return name in self._spec
+
+    def __iter__(self):
+        return iter(self._spec)
+
+    def __len__(self):
+        return len(self._spec)
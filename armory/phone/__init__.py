@@ -1,71 +1,54 @@
 # -*- encoding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
 
-from armory.phone.cli import CLI
-from armory.phone.phone import PhoneNumber
-from armory.phone.lookup import carrier_lookup, CarrierLookup
+import importlib
+import sys
 
-DEFAULT_GATEWAYS = {
-    "sms_gateways": {
-        "3 River Wireless": "@sms.3rivers.net",
-        "ACS Wireless": "@paging.acswireless.com",
-        "AT&T": "@txt.att.net",
-        "Alltel": "@message.alltel.com",
-        "BPL Mobile": "@bplmobile.com",
-        "Bell Canada": "@bellmobility.ca",
-        "Bell Mobility": "@txt.bellmobility.ca",
-        "Bell Mobility (Canada)": "@txt.bell.ca",
-        "Blue Sky Frog": "@blueskyfrog.com",
-        "Bluegrass Cellular": "@sms.bluecell.com",
-        "Boost Mobile": "@myboostmobile.com",
-        "Carolina West Wireless": "@cwwsms.com",
-        "Cellular One": "@mobile.celloneusa.com",
-        "Cellular South": "@csouth1.com",
-        "Centennial Wireless": "@cwemail.com",
-        "CenturyTel": "@messaging.centurytel.net",
-        "Cingular (Now AT&T)": "@txt.att.net",
-        "Clearnet": "@msg.clearnet.com",
-        "Comcast": "@comcastpcs.textmsg.com",
-        "Corr Wireless Communications": "@corrwireless.net",
-        "Dobson": "@mobile.dobson.net",
-        "Edge Wireless": "@sms.edgewireless.com",
-        "Fido": "@fido.ca",
-        "Golden Telecom": "@sms.goldentele.com",
-        "Helio": "@messaging.sprintpcs.com",
-        "Houston Cellular": "@text.houstoncellular.net",
-        "Idea Cellular": "@ideacellular.net",
-        "Illinois Valley Cellular": "@ivctext.com",
-        "Inland Cellular Telephone": "@inlandlink.com",
-        "MCI": "@pagemci.com",
-        "MTS": "@text.mtsmobility.com",
-        "Metro PCS": "@mymetropcs.com",
-        "Microcell": "@fido.ca",
-        "Midwest Wireless": "@clearlydigital.com",
-        "Mobilcomm": "@mobilecomm.net",
-        "Nextel": "@messaging.nextel.com",
-        "OnlineBeep": "@onlinebeep.net",
-        "PCS One": "@pcsone.net",
-        "President's Choice": "@txt.bell.ca",
-        "Public Service Cellular": "@sms.pscel.com",
-        "Qwest": "@qwestmp.com",
-        "Rogers AT&T Wireless": "@pcs.rogers.com",
-        "Rogers Canada": "@pcs.rogers.com",
-        "Solo Mobile": "@txt.bell.ca",
-        "Southwestern Bell": "@email.swbw.com",
-        "Sprint": "@messaging.sprintpcs.com",
-        "Sumcom": "@tms.suncom.com",
-        "Surewest Communicaitons": "@mobile.surewest.com",
-        "T-Mobile": "@tmomail.net",
-        "Telus": "@msg.telus.com",
-        "Tracfone": "@txt.att.net",
-        "Triton": "@tms.suncom.com",
-        "US Cellular": "@email.uscc.net",
-        "US West": "@uswestdatamail.com",
-        "Unicel": "@utext.com",
-        "Verizon": "@vtext.com",
-        "Virgin Mobile": "@vmobl.com",
-        "Virgin Mobile Canada": "@vmobile.ca",
-        "West Central Wireless": "@sms.wcc.net",
-        "Western Wireless": "@cellularonewest.com",
-    },
+# public name -> submodule, imported on first attribute access (PEP 562) so
+# that e.g. the CLI does not pay for requests/bs4 until it does a lookup
+_LAZY = {
+    'LookupCache': 'armory.phone.cache',
+    'CLI': 'armory.phone.cli',
+    'SMTPPool': 'armory.phone.delivery',
+    'GatewayResolver': 'armory.phone.gateways',
+    'load_gateways': 'armory.phone.gateways',
+    'SMS_GATEWAYS': 'armory.phone.gateway_table',
+    'normalize_number': 'armory.phone.normalize',
+    'normalize_numbers': 'armory.phone.normalize',
+    'PhoneNumber': 'armory.phone.phone',
+    'PhoneBook': 'armory.phone.phonebook',
+    'PhoneEntry': 'armory.phone.phonebook',
+    'PhoneService': 'armory.phone.service',
+    'PhoneServer': 'armory.phone.server',
+    'PhoneClient': 'armory.phone.server',
+    'carrier_lookup': 'armory.phone.lookup',
+    'CarrierLookup': 'armory.phone.lookup',
+    'LookupSession': 'armory.phone.lookup',
+    'lookup_many': 'armory.phone.lookup',
 }
+
+__all__ = sorted(_LAZY) + ['DEFAULT_GATEWAYS']
+
+
+def __getattr__(name):
+    if name == 'DEFAULT_GATEWAYS':
+        value = {
+            "sms_gateways": __getattr__('SMS_GATEWAYS'),
+        }
+    elif name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name]), name)
+    else:
+        raise AttributeError(
+            'module {0!r} has no attribute {1!r}'.format(__name__, name))
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+if sys.version_info < (3, 7):
+    # no module level __getattr__ (PEP 562), import everything up front
+    for _name in __all__:
+        __getattr__(_name)
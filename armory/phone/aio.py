@@ -0,0 +1,158 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import logging
+import smtplib
+
+try:
+    import aiosmtplib
+except ImportError:
+    aiosmtplib = None
+
+from armory.phone.delivery import DeliveryResult, encode_message
+from armory.phone.segment import segment_message
+
+SEND_TIMEOUT = 30
+CONCURRENCY = 10
+
+
+class AsyncEmailSMS(object):
+    """asyncio counterpart of :class:`armory.phone.phone.EmailSMS`
+
+    Takes the same arguments (``server`` is ``host[:port]``, port 25 by
+    default, upgraded with STARTTLS) and is used as ``async with``; long
+    messages are split into numbered parts as by ``EmailSMS``. Messages go
+    out over up to ``concurrency`` authenticated ``aiosmtplib``
+    connections, opened on demand and shared through an idle queue, so
+    the event loop is never blocked and no threads are used. Each
+    recipient gets ``timeout`` seconds; a connection that timed out or
+    failed is discarded and replaced by the next send. Requires
+    ``aiosmtplib``.
+    """
+    def __init__(self, server, username, passcode, sender=None, logger=None,
+                 concurrency=CONCURRENCY, timeout=SEND_TIMEOUT):
+        if aiosmtplib is None:
+            raise ImportError('AsyncEmailSMS requires aiosmtplib')
+        logger = logger if logger else __name__
+        self.log = logging.getLogger(logger)
+        self._server = server
+        self._smtp_user = username
+        self._passcode = passcode
+        self._sender = sender if sender else self._smtp_user
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._idle = []
+        self._slots = None
+
+    async def __aenter__(self):
+        self._idle.append(await self._connect())
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for smtp in idle:
+            try:
+                await smtp.quit()
+            except (aiosmtplib.SMTPException, OSError):
+                smtp.close()
+
+    async def _connect(self):
+        host, _, port = self._server.partition(':')
+        # same default port as smtplib.SMTP, aiosmtplib would pick 587
+        port = int(port) if port else smtplib.SMTP_PORT
+        smtp = aiosmtplib.SMTP(hostname=host, port=port, start_tls=True)
+        await smtp.connect()
+        await smtp.login(self._smtp_user, self._passcode)
+        return smtp
+
+    async def _acquire(self):
+        if self._idle:
+            return self._idle.pop()
+        return await self._connect()
+
+    async def _send(self, recipient, message, timeout):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        message = encode_message(message)
+        async with self._slots:
+            smtp = await asyncio.wait_for(self._acquire(), timeout)
+            try:
+                await asyncio.wait_for(
+                    smtp.sendmail(self._sender, recipient, message), timeout)
+            except aiosmtplib.SMTPRecipientsRefused:
+                # aiosmtplib resets the envelope, the connection is fine
+                self._idle.append(smtp)
+                raise
+            except aiosmtplib.SMTPResponseException as e:
+                # a rejected message leaves the connection usable
+                if e.code >= 500:
+                    self._idle.append(smtp)
+                else:
+                    smtp.close()
+                raise
+            except BaseException:
+                smtp.close()
+                raise
+            self._idle.append(smtp)
+
+    async def send(self, recipient, message, timeout=None):
+        """Send ``message``, split into numbered parts if over SMS size"""
+        timeout = timeout if timeout else self.timeout
+        for part in segment_message(message):
+            await self._send(recipient, part, timeout)
+        self.log.info('sender: {0}'.format(self._sender))
+        self.log.info('recipient: {0}'.format(recipient))
+        self.log.info('message: "{0}"'.format(message))
+        self.log.info('')
+
+    async def _outcome(self, recipient, parts, timeout, retries):
+        attempts = 0
+        sent = 0
+        while True:
+            attempts += 1
+            try:
+                # a retry resumes at the first unsent part
+                while sent < len(parts):
+                    await self._send(recipient, parts[sent], timeout)
+                    sent += 1
+            except aiosmtplib.SMTPRecipientsRefused as e:
+                error = e
+                break
+            except aiosmtplib.SMTPResponseException as e:
+                error = e
+                if e.code >= 500:
+                    break
+            except (aiosmtplib.SMTPException, OSError,
+                    asyncio.TimeoutError) as e:
+                error = e
+            else:
+                return DeliveryResult(recipient, True, None, attempts, None)
+            if attempts > retries:
+                break
+        self.log.error('failed to send to {0}: {1!r}'.format(
+            recipient, error))
+        return DeliveryResult(recipient, False, error, attempts, None)
+
+    async def send_many(self, recipients, message, timeout=None, retries=1):
+        """Send ``message`` to every recipient concurrently
+
+        Returns one :class:`armory.phone.delivery.DeliveryResult` per
+        recipient, in input order; failures and timeouts are retried
+        ``retries`` times on a fresh connection and then reported in the
+        results instead of raised. Refused recipients and other permanent
+        (5xx) rejections are not retried. Long messages are segmented once
+        and the parts sent to each recipient in order.
+        """
+        timeout = timeout if timeout else self.timeout
+        parts = segment_message(message)
+        results = await asyncio.gather(*(
+            self._outcome(recipient, parts, timeout, retries)
+            for recipient in recipients
+        ))
+        sent = sum(1 for result in results if result.ok)
+        self.log.info('sent {0} of {1} messages'.format(sent, len(results)))
+        return results
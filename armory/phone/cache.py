@@ -0,0 +1,125 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+
+from armory.phone.store import LogStore
+
+LOOKUP_TTL = 30 * 24 * 60 * 60
+NEGATIVE_TTL = 60 * 60
+MEMORY_SIZE = 1024
+
+
+class LookupCache(object):
+    """TTL cache in front of :func:`carrier_lookup`
+
+    Results live in an in-process LRU backed by an optional shared
+    :class:`LogStore` on disk, so every process pointed at the same
+    ``path`` reuses lookups made by the others. Failed lookups are cached
+    as well (for ``negative_ttl`` seconds) and re-raise a ValueError
+    without contacting the lookup host again.
+    """
+    def __init__(self, path=None, ttl=LOOKUP_TTL, negative_ttl=NEGATIVE_TTL,
+                 maxsize=MEMORY_SIZE, lookup=None, logname=None):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        if lookup is None:
+            from armory.phone.lookup import carrier_lookup as lookup
+        self._lookup = lookup
+        self._logname = logname if logname else ''
+        self.log = logging.getLogger(self._logname)
+        self.store = LogStore(path, logger=logname) if path else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'size': len(self._memory),
+        }
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+
+    def _remember(self, number, entry):
+        memory = self._memory
+        memory.pop(number, None)
+        memory[number] = entry
+        if len(memory) > self.maxsize:
+            memory.popitem(last=False)
+
+    def _fresh(self, entry):
+        return entry is not None and entry['expires'] > time.time()
+
+    def _disk_entry(self, number):
+        store = self.store
+        if store is None:
+            return None
+        entry = store.get(number)
+        if not self._fresh(entry):
+            # another process may have looked it up since the last scan
+            store.refresh()
+            entry = store.get(number)
+        return entry
+
+    def get(self, number):
+        """Return the cached entry for ``number`` or None if absent/expired"""
+        with self._lock:
+            entry = self._memory.get(number)
+            if self._fresh(entry):
+                self._remember(number, entry)
+                self.hits += 1
+                return entry
+            entry = self._disk_entry(number)
+            if self._fresh(entry):
+                self._remember(number, entry)
+                self.disk_hits += 1
+                return entry
+        return None
+
+    def put(self, number, info=None, error=None):
+        ok = error is None
+        entry = {
+            'expires': time.time() + (self.ttl if ok else self.negative_ttl),
+            'ok': ok,
+            'info': info if ok else '{0!r}'.format(error),
+        }
+        with self._lock:
+            self._remember(number, entry)
+            if self.store is not None:
+                self.store[number] = entry
+        return entry
+
+    def lookup(self, number):
+        """Return the lookup info for ``number``, using the cache if fresh
+
+        Raises ValueError for a failed lookup, cached or not.
+        """
+        entry = self.get(number)
+        if entry is None:
+            self.misses += 1
+            try:
+                info = self._lookup(number, self._logname)
+            except ValueError as e:
+                self.put(number, error=e)
+                raise
+            entry = self.put(number, info)
+        elif not entry['ok']:
+            self.negative_hits += 1
+        if not entry['ok']:
+            raise ValueError('lookup failed for {0}: {1}'.format(
+                number, entry['info']))
+        return entry['info']
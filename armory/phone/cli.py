@@ -10,18 +10,52 @@ except:
 import click
 import os
 import logging
-import json
 
 from collections import OrderedDict
 
+from armory.__version__ import __version__
 from armory.serialize import jsonify
-from armory.phone.phone import PhoneNumber, EmailSMS
+from armory.phone.phone import PhoneNumber
+from armory.phone.service import PhoneService
+from armory.phone.store import PhoneCache, is_legacy_json, migrate_json
 
 CONFIG_FILE = '.phonecache'
+CACHE_FILE = '.phonecache.log'
+SOCKET_FILE = '.phonecache.sock'
+
+log = logging.getLogger(__name__)
+debug, info, error = log.debug, log.info, log.error
 
 helptxt = {}
-helptxt['config_file'] = 'specify the config file location'
+helptxt['config_file'] = (
+    'cache file location (default {0}); a legacy JSON config file is '
+    'imported into <path>.log'.format(CACHE_FILE))
 helptxt['list_lookups'] = 'list the currently stored lookups'
+helptxt['gateways_file'] = 'carrier SMS gateway overrides, one per line'
+helptxt['socket'] = 'Unix socket of a `phone serve` process to forward to'
+
+
+def open_cache(path=None):
+    """Open the cache log, importing a legacy JSON config once
+
+    ``path`` (``-c``) may name the log itself or, as it used to, a legacy
+    JSON config file; the latter is never appended to but imported into
+    ``<path>.log`` which is used from then on.
+    """
+    cache_file, legacy = path, None
+    if path is None:
+        cache_file, legacy = CACHE_FILE, CONFIG_FILE
+    elif os.path.exists(path) and is_legacy_json(path):
+        cache_file, legacy = path + '.log', path
+    migrate = (legacy is not None and not os.path.exists(cache_file)
+               and os.path.exists(legacy))
+    cache = PhoneCache(cache_file)
+    if migrate:
+        imported = migrate_json(legacy, cache)
+        info('imported {0} lookups from {1} into {2}'.format(
+            imported, legacy, cache_file))
+    return cache
+
 
 #@click.argument('import_path', click.Path(exists=True), required=False)
 @click.group(invoke_without_command=True)
@@ -32,108 +66,70 @@ helptxt['list_lookups'] = 'list the currently stored lookups'
     '-l', '--list', 'list_lookups',
     is_flag=True, default=False, #is_eager=True,
     help=helptxt.get('list_lookups'))
-@click.version_option(message='%(prog)s %(version)s')
+@click.option(
+    '-g', '--gateways', 'gateways',
+    type=click.Path(exists=True, dir_okay=False),
+    help=helptxt.get('gateways_file'))
+@click.option(
+    '--socket', 'socket_path',
+    help=helptxt.get('socket'))
+@click.version_option(__version__, message='%(prog)s %(version)s')
 @click.pass_context
-def CLI(ctx, config, list_lookups):
+def CLI(ctx, config, list_lookups, gateways, socket_path):
     """Lookup basic phone number information or send SMS messages"""
     loglevel = 'info'
     verbosity = getattr(logging, loglevel.upper(), 'INFO')
     #verbosity = logging.DEBUG
-    ctx.obj = {
-        'verbosity': verbosity,
-        'logfile': None,
-        'config': {'lookups': {}},
-    }
     #logfmt = '%(levelname)-8s | %(message)s'
     logfmt = '%(message)s'
     logging.basicConfig(format=logfmt, level=verbosity)
     debug('CLI >  CWD="{0}"'.format(os.getcwd()))
-    with open(CONFIG_FILE, 'ab+') as phonedb:
-        phonedb.seek(0)
-        rawdata = phonedb.read()
-        if rawdata:
-            data = json.loads(rawdata, object_pairs_hook=OrderedDict)
-            debug(data)
-            ctx.obj['config'] = data
-            if 'lookups' not in ctx.obj['config']:
-                ctx.obj['config']['lookups'] = {}
-
-    if 'sms_gateways' not in ctx.obj['config']:
-        """
-        gwsorted = sorted(ctx.obj['config']['sms_gateways'].items())
-        gwordered = OrderedDict()
-        for (k, v) in gwsorted:
-            gwordered[k] = v
-        ctx.obj['config']['sms_gateways'] = gwordered
-        """
-        info('loading SMS gateways...')
-        sms_gateways = {}
-        with open('carrier-gateways', 'rb') as gateways:
-            gwdata = gateways.read()
-            import re
-            re_carrier = r'(?P<carrier>\w+[\w\&\(\)\-\'\s]*[\w\)\(]+)\s+'
-            re_gateway = r'10digitphonenumber(?P<gateway>\@\w[\w\.]*\w)\s+'
-            gwre = re.compile(re_carrier + re_gateway)
-            gws = gwre.findall(gwdata)
-            for gw in gwre.finditer(gwdata):
-                gwinfo = gw.groupdict()
-                debug(gw.groupdict())
-                sms_gateways[gwinfo['carrier']] = gwinfo['gateway']
-            num_lines = len([l for l in gwdata.split('\n') if len(l)])
-            debug('lines={0} ({1} / 2)'.format(num_lines/2, num_lines))
-            debug('matches={0}'.format(len(data)))
-        ctx.obj['config']['sms_gateways'] = sms_gateways
-        with open(CONFIG_FILE, 'wb') as cfg:
-            cfg.write(json.dumps(ctx.obj['config'], indent=2))
-        info('SMS gateways written to config')
+    socket_path = socket_path if socket_path else SOCKET_FILE
+    ctx.obj = {
+        'verbosity': verbosity,
+        'logfile': None,
+        'gateways': gateways,
+        'socket': socket_path,
+    }
+
+    # forward to a running `phone serve`, unless this is one or edits config
+    local = ctx.invoked_subcommand in ('serve', 'config')
+    if not local and os.path.exists(socket_path):
+        from armory.phone.server import PhoneClient
+        if PhoneClient.available(socket_path):
+            debug('forwarding to {0}'.format(socket_path))
+            client = PhoneClient(socket_path)
+            ctx.call_on_close(client.close)
+            ctx.obj['service'] = client
+    if 'service' not in ctx.obj:
+        cache = open_cache(config)
+        from armory.phone.cache import LookupCache
+        # remote results shared by every process using this cache
+        lookup_cache = LookupCache(cache.store.path + '.lookups')
+        service = PhoneService(
+            cache, gateways=gateways, lookup_cache=lookup_cache)
+        ctx.call_on_close(service.close)
+        ctx.obj['cache'] = cache
+        ctx.obj['service'] = service
 
     if list_lookups:
-        sms_updated = False
-        from fuzzywuzzy import fuzz
-        from fuzzywuzzy import process
-        lookups = ctx.obj['config']['lookups']
         info('cached lookups:')
-        for number, pinfo in lookups.iteritems():
-            owner = pinfo['comment']
-            common = pinfo['body']['national_format']
-            carrier = pinfo['body']['carrier']['name']
-            pntype = pinfo['body']['carrier']['type']
-            info('  {0}: {1}'.format(owner, common))
-            info('    - carrier: {0}'.format(carrier))
-            info('    - type: {0}'.format(pntype))
-            debug('    - unformatted: {0}'.format(number))
-            if 'sms' not in lookups[number]:
-                carriers = ctx.obj['config']['sms_gateways'].keys()
-                fuzzy = process.extract(carrier, carriers)
-                fuzz_max = 0
-                result = []
-                gateway_key = None
-                for f in fuzzy:
-                    if f[1] >= fuzz_max:
-                        fuzz_max = f[1]
-                        result.append(f[0])
-                debug(result)
-                if len(result) > 1:
-                    if len(sorted(result)[0]) <= len(carrier):
-                        gateway_key = sorted(result)[0]
-                    else:
-                        gateway_key = result[0]
-                else:
-                    gateway_key = result[0]
-                gw_suffix = ctx.obj['config']['sms_gateways'][gateway_key]
-                ctx.obj['config']['lookups'][number]['sms'] = '{0}{1}'.format(
-                    number, gw_suffix)
-                sms_updated = True
+        for entry in ctx.obj['service'].list_lookups():
+            info('  {0}: {1}'.format(
+                entry['comment'], entry['national_format']))
+            info('    - carrier: {0}'.format(entry['carrier']))
+            info('    - type: {0}'.format(entry['type']))
+            debug('    - unformatted: {0}'.format(entry['number']))
             info('    - SMS gateway: {0}'.format(
-                ctx.obj['config']['lookups'][number]['sms']))
-        if sms_updated:
-            with open(CONFIG_FILE, 'wb') as cfg:
-                cfg.write(json.dumps(ctx.obj['config'], indent=2))
+                entry['sms'] if entry['sms'] else 'unknown'))
         ctx.exit()
 
 
 helptxt['comment'] = 'add a comment to the phone number record (recommended)'
 helptxt['nocache'] = 'do not cache the results into the config file'
+helptxt['numbers_file'] = 'look up every number in a file (one per line)'
+helptxt['concurrency'] = 'number of concurrent lookups when using --file'
+helptxt['rate'] = 'maximum lookup requests per second when using --file'
 
 
 @click.command()
@@ -144,31 +140,72 @@ helptxt['nocache'] = 'do not cache the results into the config file'
     '--no-cache', 'cache',
     is_flag=True, default=True,
     help=helptxt.get('nocache'))
-@click.argument('number')
+@click.option(
+    '-f', '--file', 'numbers_file',
+    type=click.File('r'),
+    help=helptxt.get('numbers_file'))
+@click.option(
+    '-j', '--jobs', 'concurrency',
+    type=int, default=4,
+    help=helptxt.get('concurrency'))
+@click.option(
+    '--rate', 'rate',
+    type=float, default=None,
+    help=helptxt.get('rate'))
+@click.argument('number', required=False)
 @click.pass_context
-def lookup(ctx, number, comment, cache):
+def lookup(ctx, number, comment, cache, numbers_file, concurrency, rate):
     """Get the carrier and country code for a phone number"""
-    phone = PhoneNumber(number, comment=comment)
-    info('{0} | {1}'.format(phone.number, ctx.obj['config']['lookups'].keys()))
-    if phone.number in ctx.obj['config']['lookups']:
-        info('{0} is already cached:'.format(phone.number))
-        info(jsonify(ctx.obj['config']['lookups'][phone.number]))
+    service = ctx.obj['service']
+    if numbers_file is not None:
+        lookup_file(service, numbers_file, comment, cache, concurrency, rate)
+        return
+    if number is None:
+        error('a phone number or --file is required')
+        return
+    try:
+        result = service.lookup(number, comment=comment, cache=cache)
+    except ValueError as e:
+        error('{0} | lookup failed: {1}'.format(number, e))
+        return
+    if result['cached']:
+        info('{0} is already cached:'.format(result['number']))
+        info(jsonify(result['data']))
         return
-    data = phone.lookup()
+    phone = PhoneNumber(result['number'], data=result['data'])
     info('carrier = {0}'.format(phone.carrier))
     info('type = {0}'.format(phone.type))
     info('cache = {0}'.format(cache))
-    if cache:
-        ctx.obj['config']['lookups'][phone.number] = phone.raw
-        with open(CONFIG_FILE, 'wb') as cfg:
-            cfg.write(json.dumps(ctx.obj['config'], indent=2))
 
 CLI.add_command(lookup)
 
 
+def lookup_file(service, numbers_file, comment, cache, concurrency, rate):
+    numbers = []
+    for line in numbers_file:
+        line = line.split('#', 1)[0].strip()
+        if line:
+            numbers.append(line)
+    info('looking up {0} numbers...'.format(len(numbers)))
+    results = service.lookup_many(
+        numbers, comment=comment, cache=cache, concurrency=concurrency,
+        rate=rate)
+    for result in results:
+        number = result['number']
+        if result['error'] is not None:
+            error('{0} | lookup failed: {1}'.format(number, result['error']))
+        elif result['cached']:
+            info('{0} is already cached'.format(number))
+        else:
+            info('{0} | carrier = {1} | type = {2}'.format(
+                number, result['carrier'], result['type']))
+
+
 helptxt['phone_number'] = '10 digit US/CA phone number'
 helptxt['send_all'] = 'message is sent to all cached numbers (-n is ignored)'
 helptxt['sms_message'] = 'SMS message to be sent to recipients (required)'
+helptxt['sms_connections'] = 'number of SMTP connections used with --all'
+helptxt['sms_batch'] = 'max recipients per SMTP transaction with --all'
 
 
 @click.command()
@@ -184,43 +221,69 @@ helptxt['sms_message'] = 'SMS message to be sent to recipients (required)'
     '-m', '--message', 'message',
     required=True,
     help=helptxt.get('sms_message'))
+@click.option(
+    '-j', '--connections', 'connections',
+    type=int, default=4,
+    help=helptxt.get('sms_connections'))
+@click.option(
+    '-b', '--batch', 'batch',
+    type=int, default=None,
+    help=helptxt.get('sms_batch'))
 @click.pass_context
-def sms(ctx, numbers, send_all, message):
-    smtp_login = ctx.obj['config'].get('smtp_login', None)
-    if smtp_login is None:
-        error('cannot send SMS messages until SMTP has been configured')
-        return
+def sms(ctx, numbers, send_all, message, connections, batch):
     debug(numbers)
     debug('message="{0}"'.format(message))
-    debug(jsonify(smtp_login))
-    if len(message) > 160:
-        info('converting to multipart message...')
+    if not send_all and not numbers:
+        info('no numbers have been selected!')
         return
-    lookups = ctx.obj['config'].get('lookups')
     if send_all:
         info('sending to all stored phone numbers...')
-        with EmailSMS(**smtp_login) as smsgw:
-            for num, data in lookups.iteritems():
-                info('sending to {0}[{1}]'.format(
-                    data['comment'], data['sms']))
-                smsgw.send(data['sms'], message)
-    elif len(numbers):
-        info('sending to numbers: {0}'.format(numbers))
-        with EmailSMS(**smtp_login) as smsgw:
-            for num in numbers:
-                data = lookups.get(num, None)
-                if not data:
-                    info('WARNING | unknown number: {0}'.format(num))
-                    continue
-                info('sending to {0}[{1}]'.format(
-                    data['comment'], data['sms']))
-                smsgw.send(data['sms'], message)
     else:
-        info('no numbers have been selected!')
+        info('sending to numbers: {0}'.format(numbers))
+    try:
+        result = ctx.obj['service'].sms(
+            message, numbers=list(numbers), send_all=send_all,
+            connections=connections, batch=batch)
+    except ValueError as e:
+        error('{0}'.format(e))
+        return
+    if result['parts'] > 1:
+        info('converted to a {0} part message'.format(result['parts']))
+    for num in result['unknown']:
+        info('WARNING | unknown number or SMS gateway: {0}'.format(num))
+    for recipient in result['sent']:
+        info('sent to {0}'.format(recipient))
+    for failed in result['failed']:
+        error('failed to send to {0}: {1}'.format(
+            failed['recipient'], failed['error']))
+    info('sent {0}, failed {1}'.format(
+        len(result['sent']), len(result['failed'])))
 
 CLI.add_command(sms)
 
 
+helptxt['http_port'] = 'also accept JSON requests over HTTP on this port'
+
+
+@click.command()
+@click.option(
+    '--http', 'http_port',
+    type=int, default=None,
+    help=helptxt.get('http_port'))
+@click.pass_context
+def serve(ctx, http_port):
+    """Keep the cache and connections warm for other `phone` commands"""
+    from armory.phone.server import PhoneServer
+    server = PhoneServer(
+        ctx.obj['service'], ctx.obj['socket'], http_port=http_port)
+    try:
+        server.serve_forever()
+    except ValueError as e:
+        error('{0}'.format(e))
+
+CLI.add_command(serve)
+
+
 helptxt['config_server'] = 'SMTP server which should be used to proxy SMS'
 helptxt['config_uname'] = 'SMTP server login username'
 helptxt['config_pass'] = 'SMTP server login passcode'
@@ -238,14 +301,14 @@ helptxt['config_pass'] = 'SMTP server login passcode'
     help=helptxt.get('config_pass'))
 @click.pass_context
 def config(ctx, server, username, passcode):
-    smtp_login = ctx.obj['config'].get('smtp_login', None)
+    settings = ctx.obj['cache'].settings
+    smtp_login = settings.get('smtp_login', None)
     if smtp_login is None:
-        ctx.obj['config']['smtp_login'] = OrderedDict()
+        smtp_login = OrderedDict()
         smtp_login['server'] = None
         smtp_login['username'] = None
         smtp_login['passcode'] = None
-        smtp_login = ctx.obj['config']['smtp_login']
-    debug(jsonify(ctx.obj['config']['smtp_login']))
+    debug(jsonify(smtp_login))
 
     update_config = False
     if server is not None and server != smtp_login['server']:
@@ -270,11 +333,10 @@ def config(ctx, server, username, passcode):
     if not update_config:
         info('no config changes to write')
         return
-    with open(CONFIG_FILE, 'wb') as config:
-        config.write(jsonify(ctx.obj['config']))
+    settings['smtp_login'] = smtp_login
     info('\nSMTP settings:')
-    info('  - server = {0}'.format(ctx.obj['config']['smtp_login']['server']))
-    info('  - user = {0}'.format(ctx.obj['config']['smtp_login']['username']))
-    info('  - pass = {0}'.format(ctx.obj['config']['smtp_login']['passcode']))
+    info('  - server = {0}'.format(smtp_login['server']))
+    info('  - user = {0}'.format(smtp_login['username']))
+    info('  - pass = {0}'.format(smtp_login['passcode']))
 
 CLI.add_command(config)
@@ -0,0 +1,304 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import smtplib
+import socket
+import threading
+import time
+
+from collections import OrderedDict, namedtuple
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from armory.utils.builtins import items
+
+MAX_MESSAGES = 100
+
+# 421: the server is closing the transmission channel
+_CLOSING = 421
+_DONE = object()
+# seconds between checks that a worker is left to take queued messages
+_POLL = 0.1
+
+MAX_RECIPIENTS = 50
+DeliveryResult = namedtuple(
+    'DeliveryResult', 'recipient ok error attempts connection')
+
+
+def _reconnect(error):
+    """True if ``error`` means the connection (not the message) failed"""
+    if isinstance(error, smtplib.SMTPResponseException):
+        reconnect = (smtplib.SMTPConnectError, smtplib.SMTPHeloError)
+        return error.smtp_code == _CLOSING or isinstance(error, reconnect)
+    if isinstance(error, smtplib.SMTPException):
+        return isinstance(error, smtplib.SMTPServerDisconnected)
+    return True
+
+
+def encode_message(message):
+    """Return ``message`` in a form :meth:`smtplib.SMTP.sendmail` accepts
+
+    ASCII text is sent as is, anything else as a UTF-8 MIME text part
+    (base64 encoded, so it is ASCII as well).
+    """
+    try:
+        message.encode('ascii')
+    except UnicodeError:
+        from email.mime.text import MIMEText
+        return MIMEText(message, 'plain', 'utf-8').as_string()
+    return message
+
+
+def _recipient_key(recipient):
+    local, _, domain = recipient.strip().rpartition('@')
+    digits = ''.join(c for c in local if c.isdigit())
+    if len(digits) == 11 and digits.startswith('1'):
+        digits = digits[1:]
+    return (digits if digits else local.lower()), domain.lower()
+
+
+def group_recipients(recipients, max_recipients=MAX_RECIPIENTS):
+    """Dedupe gateway addresses and batch them per gateway domain
+
+    Addresses are compared by the digits of their local part (ignoring a
+    leading US/CA country code and formatting) and their lowercased
+    domain, keeping the first spelling seen. Returns tuples of at most
+    ``max_recipients`` addresses sharing a domain, each suitable for a
+    single SMTP transaction.
+    """
+    domains = OrderedDict()
+    seen = set()
+    for recipient in recipients:
+        key = _recipient_key(recipient)
+        if key in seen:
+            continue
+        seen.add(key)
+        domains.setdefault(key[1], []).append(recipient)
+    groups = []
+    for domain, addresses in items(domains):
+        for i in range(0, len(addresses), max_recipients):
+            groups.append(tuple(addresses[i:i + max_recipients]))
+    return groups
+
+
+class DeliveryReport(object):
+    """Outcome of a :class:`SMTPPool` run, one result per message"""
+    def __init__(self):
+        self.results = []
+        self.connections = 0
+        self.transactions = 0
+        self.reconnects = 0
+        self.started = time.time()
+        self.finished = None
+
+    @property
+    def sent(self):
+        return [r for r in self.results if r.ok]
+
+    @property
+    def failed(self):
+        return [r for r in self.results if not r.ok]
+
+    @property
+    def elapsed(self):
+        finished = self.finished if self.finished else time.time()
+        return finished - self.started
+
+    @property
+    def rate(self):
+        elapsed = self.elapsed
+        return len(self.results) / elapsed if elapsed else 0.0
+
+    def __repr__(self):
+        return '<DeliveryReport: {0} sent, {1} failed, {2:.1f}/s>'.format(
+            len(self.sent), len(self.failed), self.rate)
+
+
+class SMTPPool(object):
+    """Deliver messages over a pool of persistent SMTP connections
+
+    ``connect`` is called (from the worker threads) to open each
+    authenticated :class:`smtplib.SMTP` connection. ``size`` workers pull
+    ``(sender, recipient, message)`` tuples from a shared queue and send
+    them over their own connection; a tuple of recipients (see
+    :func:`group_recipients`) shares one transaction and a tuple of
+    messages (the parts of a long SMS) is sent in order, with a retry
+    resuming at the first unsent part. Connections are kept open between
+    messages and recycled after ``max_messages`` so relays enforcing a
+    per-session cap are never hit. A dropped connection is reopened and
+    the message retried up to ``retries`` times, at once and then with
+    exponential ``backoff``; refused recipients and other SMTP errors fail
+    only that message.
+
+    Connections left open by one :meth:`deliver` are kept for the next one
+    (checked with a NOOP before reuse) until :meth:`close`, so a
+    long-lived pool skips the connect, STARTTLS and login round trips.
+    """
+    def __init__(self, connect, size=4, max_messages=MAX_MESSAGES,
+                 retries=2, backoff=0.5, logname=None):
+        self._connect = connect
+        self.size = size
+        self.max_messages = max_messages
+        self.retries = retries
+        self.backoff = backoff
+        self.log = logging.getLogger(logname if logname else __name__)
+        # (connection, messages sent over it) kept between deliveries
+        self._idle = []
+        self._idle_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Quit the connections kept open between deliveries"""
+        with self._idle_lock:
+            idle, self._idle = self._idle, []
+        for smtp, _ in idle:
+            self._quit(smtp)
+
+    def _quit(self, smtp):
+        try:
+            smtp.quit()
+        except (smtplib.SMTPException, socket.error):
+            smtp.close()
+
+    def _checkout(self):
+        """Return a live idle ``(connection, count)`` or ``(None, 0)``"""
+        while True:
+            with self._idle_lock:
+                if not self._idle:
+                    return None, 0
+                smtp, count = self._idle.pop()
+            try:
+                if smtp.noop()[0] == 250:
+                    return smtp, count
+            except (smtplib.SMTPException, socket.error):
+                pass
+            smtp.close()
+
+    def _worker(self, worker_id, pending, report, lock):
+        log = self.log
+        smtp, count = self._checkout()
+        while True:
+            item = pending.get()
+            if item is _DONE:
+                break
+            sender, recipient, message = item
+            parts = message if isinstance(message, tuple) else (message,)
+            group = recipient if isinstance(recipient, tuple) else None
+            rcpts = list(group) if group else [recipient]
+            refused = {}
+            sent = 0
+            error = None
+            attempts = 0
+            while attempts <= self.retries:
+                if attempts > 1:
+                    # reconnect at once, back off if that did not help
+                    time.sleep(self.backoff * 2 ** (attempts - 2))
+                attempts += 1
+                try:
+                    while sent < len(parts):
+                        if smtp is not None and count >= self.max_messages:
+                            self._quit(smtp)
+                            smtp = None
+                        if smtp is None:
+                            smtp = self._connect()
+                            count = 0
+                            with lock:
+                                report.connections += 1
+                                if attempts > 1:
+                                    report.reconnects += 1
+                        count += 1
+                        refused.update(smtp.sendmail(
+                            sender, rcpts, encode_message(parts[sent])))
+                        rcpts = [r for r in rcpts if r not in refused]
+                        sent += 1
+                    error = None
+                    break
+                except (smtplib.SMTPException, socket.error) as e:
+                    error = e
+                    if group and isinstance(
+                            e, smtplib.SMTPRecipientsRefused):
+                        refused.update(e.recipients)
+                        rcpts = []
+                        error = None
+                        break
+                    if not _reconnect(e):
+                        break
+                    log.debug('connection {0} failed for {1}: {2!r}'.format(
+                        worker_id, recipient, e))
+                    if smtp is not None:
+                        smtp.close()
+                    smtp = None
+                except Exception as e:
+                    # e.g. a message smtplib cannot encode; the worker must
+                    # survive it or deliver() waits on the queue forever
+                    log.exception('connection {0} failed for {1}'.format(
+                        worker_id, recipient))
+                    error = e
+                    if smtp is not None:
+                        smtp.close()
+                    smtp = None
+                    break
+            results = [
+                DeliveryResult(rcpt, error is None, error, attempts,
+                               worker_id)
+                for rcpt in rcpts
+            ]
+            for rcpt, reply in items(refused):
+                error = smtplib.SMTPRecipientsRefused({rcpt: reply})
+                results.append(DeliveryResult(
+                    rcpt, False, error, attempts, worker_id))
+            with lock:
+                report.results.extend(results)
+                report.transactions += sent
+        if smtp is not None:
+            with self._idle_lock:
+                self._idle.append((smtp, count))
+
+    def _put(self, pending, item, workers):
+        """Queue ``item`` unless no worker is left to take it"""
+        while True:
+            try:
+                pending.put(item, timeout=_POLL)
+            except queue.Full:
+                if not any(worker.is_alive() for worker in workers):
+                    return False
+            else:
+                return True
+
+    def deliver(self, messages):
+        """Send ``(sender, recipient, message)`` tuples and report results
+
+        Returns a :class:`DeliveryReport` once every message was either
+        sent or failed.
+        """
+        report = DeliveryReport()
+        lock = threading.Lock()
+        pending = queue.Queue(maxsize=self.size * 4)
+        workers = [
+            threading.Thread(
+                target=self._worker, args=(i, pending, report, lock))
+            for i in range(self.size)
+        ]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        try:
+            for item in messages:
+                if not self._put(pending, item, workers):
+                    raise RuntimeError('every SMTP worker has stopped')
+        finally:
+            for _ in workers:
+                self._put(pending, _DONE, workers)
+            for worker in workers:
+                worker.join()
+        report.finished = time.time()
+        return report
@@ -0,0 +1,213 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import difflib
+import io
+import logging
+import math
+import os
+import re
+import threading
+
+from armory.utils.builtins import items
+
+_JOINERS = re.compile(r"[&'\-\.]")
+_TOKENS = re.compile(r'[a-z0-9]+')
+_FUZZY_CUTOFF = 0.75
+_TOKEN_CUTOFF = 0.55
+# notes such as "(Now AT&T)" do not have to be matched
+_NOTES = re.compile(r'\([^)]*\)')
+_MEMO_SIZE = 4096
+
+# "<carrier name> 10digitphonenumber@gateway.domain", one per line or with
+# the gateway on the line after the carrier name (as copied from listings)
+_GATEWAY_LINE = re.compile(
+    r"^[ \t]*(?P<carrier>\w[\w&()\-'. \t]*?)\s+"
+    r"(?:10digitphonenumber)?(?P<gateway>@\w[\w.\-]*\w)[ \t]*$",
+    re.MULTILINE | re.UNICODE)
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+log = logging.getLogger(__name__)
+
+
+def normalize_carrier(name):
+    """Tokenize a carrier name: ``'T-Mobile USA, Inc.'`` -> tmobile usa inc"""
+    return tuple(_TOKENS.findall(_JOINERS.sub('', name.lower())))
+
+
+class GatewayResolver(object):
+    """Resolve carrier names to SMS gateway keys in roughly constant time
+
+    Built once from a ``{carrier: "@gateway"}`` mapping into an exact alias
+    table of normalized names and an inverted token index weighted by how
+    rare each token is. Candidates are scored by how much of the gateway
+    name's weight (less any parenthesized note) the carrier name covers,
+    so long legal names like "Cellco Partnership dba Verizon Wireless"
+    still match "Verizon" while generic words like "wireless" alone cannot
+    reach the cutoff. Names without a good enough candidate are retried
+    with misspelled tokens fuzzy matched to known ones. Results are
+    memoized per name and ties are broken by the weighted overlap of both
+    names, then the shorter, then the alphabetically first gateway name.
+    """
+    def __init__(self, gateways, aliases=None):
+        self.gateways = dict(gateways)
+        self._aliases = {}
+        self._tokens = {}
+        self._index = {}
+        for key in sorted(self.gateways):
+            tokens = normalize_carrier(key)
+            self._tokens[key] = tokens
+            self._aliases.setdefault(' '.join(tokens), key)
+            self._aliases.setdefault(''.join(tokens), key)
+            for token in set(tokens):
+                self._index.setdefault(token, []).append(key)
+        for alias, key in items(aliases or {}):
+            tokens = normalize_carrier(alias)
+            self._aliases[' '.join(tokens)] = key
+            self._aliases[''.join(tokens)] = key
+        total = len(self.gateways)
+        self._weights = dict(
+            (token, math.log(1.0 + float(total) / len(keys)))
+            for token, keys in items(self._index)
+        )
+        # tokens no gateway uses are as distinctive as the rarest ones
+        self._unknown = math.log(1.0 + total)
+        self._totals = dict(
+            (key, sum(self._weights[t] for t in set(tokens)))
+            for key, tokens in items(self._tokens)
+        )
+        self._core = {}
+        for key, tokens in items(self._tokens):
+            core = set(normalize_carrier(_NOTES.sub(' ', key)))
+            self._core[key] = core.intersection(tokens) or set(tokens)
+        self._core_totals = dict(
+            (key, sum(self._weights[t] for t in core))
+            for key, core in items(self._core)
+        )
+        self._known = sorted(self._index)
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def _by_tokens(self, tokens):
+        tokens = set(tokens)
+        shared = {}
+        total = 0.0
+        for token in tokens:
+            weight = self._weights.get(token)
+            if weight is None:
+                total += self._unknown
+                continue
+            total += weight
+            for key in self._index[token]:
+                shared[key] = shared.get(key, 0.0) + weight
+        best = None
+        for key, weight in items(shared):
+            covered = sum(
+                self._weights[t] for t in self._core[key] if t in tokens)
+            score = round(covered / self._core_totals[key], 9)
+            overlap = round(weight / (total + self._totals[key] - weight), 9)
+            rank = (-score, -overlap, len(key), key)
+            if score >= _TOKEN_CUTOFF and (best is None or rank < best):
+                best = rank
+        return best[-1] if best is not None else None
+
+    def _fuzzy(self, tokens):
+        """Retry the token match with misspelled tokens corrected"""
+        corrected = []
+        for token in tokens:
+            if token not in self._weights:
+                matches = difflib.get_close_matches(
+                    token, self._known, n=1, cutoff=_FUZZY_CUTOFF)
+                token = matches[0] if matches else token
+            corrected.append(token)
+        return self._by_tokens(corrected)
+
+    def resolve(self, carrier):
+        """Return the gateway key for ``carrier`` or None"""
+        if not carrier:
+            return None
+        tokens = normalize_carrier(carrier)
+        name = ' '.join(tokens)
+        key = self._aliases.get(name, self._aliases.get(''.join(tokens)))
+        if key is not None:
+            return key
+        with self._lock:
+            if name in self._memo:
+                return self._memo[name]
+        key = self._by_tokens(tokens)
+        if key is None:
+            key = self._fuzzy(tokens)
+        with self._lock:
+            if len(self._memo) >= _MEMO_SIZE:
+                self._memo.clear()
+            self._memo[name] = key
+        return key
+
+    def gateway(self, carrier):
+        """Return the ``@domain`` gateway suffix for ``carrier`` or None"""
+        key = self.resolve(carrier)
+        return self.gateways[key] if key is not None else None
+
+    def sms_address(self, number, carrier):
+        suffix = self.gateway(carrier)
+        if suffix is None:
+            return None
+        return '{0}{1}'.format(number, suffix)
+
+
+def parse_gateways(text):
+    """Parse a ``carrier-gateways`` style listing in a single pass"""
+    return dict(
+        (m.group('carrier'), m.group('gateway'))
+        for m in _GATEWAY_LINE.finditer(text)
+    )
+
+
+def _stamp(path):
+    if path is None:
+        return None
+    stat = os.stat(path)
+    return stat.st_mtime, stat.st_size
+
+
+def _load(path, stamp):
+    entry = _tables.get(path)
+    if entry is not None and entry[0] == stamp:
+        return entry
+    from armory.phone.gateway_table import SMS_GATEWAYS
+    table = dict(SMS_GATEWAYS)
+    if path is not None:
+        with io.open(path, 'r', encoding='utf-8') as fp:
+            overrides = parse_gateways(fp.read())
+        if not overrides:
+            log.warning('no carrier gateways found in {0}'.format(path))
+        table.update(overrides)
+    entry = [stamp, table, None]
+    _tables[path] = entry
+    return entry
+
+
+def load_gateways(path=None):
+    """Return the carrier -> gateway table
+
+    The packaged table is imported on first use and entries parsed from
+    the override file at ``path`` are layered on top of it. Results are
+    cached per absolute path until the file's mtime or size changes.
+    """
+    path = os.path.abspath(path) if path is not None else None
+    stamp = _stamp(path)
+    with _tables_lock:
+        return _load(path, stamp)[1]
+
+
+def get_resolver(path=None):
+    """Return a shared :class:`GatewayResolver` for :func:`load_gateways`"""
+    path = os.path.abspath(path) if path is not None else None
+    stamp = _stamp(path)
+    with _tables_lock:
+        entry = _load(path, stamp)
+        if entry[2] is None:
+            entry[2] = GatewayResolver(entry[1])
+        return entry[2]
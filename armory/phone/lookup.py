@@ -4,26 +4,134 @@ from __future__ import absolute_import
 import requests
 import json
 import logging
+import re
+import threading
+import time
 
-from bs4 import BeautifulSoup as htmldoc
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
+try:
+    from html import unescape
+except ImportError:
+    from HTMLParser import HTMLParser
+    unescape = HTMLParser().unescape
 
-def carrier_lookup():
-    return None
+from armory.serialize import jsonify
+from armory.utils.builtins import items
 
+DEFAULT_HOST = 'https://www.twilio.com'
+TOKEN_TTL = 600
 
-class CarrierLookup(object):
-    def __init__(self, number, logname=None):
-        self.number = number
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+_TAG_RE = re.compile(r'<(meta|input)\b([^>]*)>', re.IGNORECASE)
+_ATTR_RE = re.compile(
+    r'([^\s=/>]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))')
+
+
+def _attrs(rawattrs):
+    attrs = {}
+    for m in _ATTR_RE.finditer(rawattrs):
+        name, dquoted, squoted, bare = m.groups()
+        value = next(v for v in (dquoted, squoted, bare) if v is not None)
+        attrs[name.lower()] = unescape(value)
+    return attrs
+
+
+def extract_tokens(html):
+    """Extract the ``(csrf, sid)`` pair from the lookup page
+
+    Only ``<meta>`` and ``<input>`` tags are visited, with precompiled
+    regexes, and the scan stops as soon as both values are found; no DOM
+    is built. Raises ValueError if either value is missing.
+    """
+    csrf = None
+    sid = None
+    for m in _TAG_RE.finditer(html):
+        if csrf is not None and sid is not None:
+            break
+        tag = m.group(1).lower()
+        rawattrs = m.group(2)
+        if tag == 'meta' and csrf is None and 'csrfToken' in rawattrs:
+            attrs = _attrs(rawattrs)
+            if attrs.get('name') == 'csrfToken':
+                csrf = attrs.get('content')
+        elif tag == 'input' and sid is None and 'visitorSid' in rawattrs:
+            attrs = _attrs(rawattrs)
+            hidden = attrs.get('type', '').lower() == 'hidden'
+            if hidden and attrs.get('role') == 'visitorSid':
+                sid = attrs.get('value')
+    if csrf is None or sid is None:
+        raise ValueError('csrf token or visitor sid not found')
+    return csrf, sid
+
+
+def _htmldoc():
+    """BeautifulSoup, imported on first use, or None if not installed"""
+    try:
+        from bs4 import BeautifulSoup
+    except ImportError:
+        return None
+    return BeautifulSoup
+
+
+def extract_tokens_soup(html):
+    """BeautifulSoup based :func:`extract_tokens` (requires ``bs4``)"""
+    page = _htmldoc()(html, 'html.parser')
+    token = page.find('meta', attrs={'name': 'csrfToken'})
+    sid_attrs = {'type': 'hidden', 'role': 'visitorSid'}
+    role = page.find('input', attrs=sid_attrs)
+    if token is None or role is None:
+        raise ValueError('csrf token or visitor sid not found')
+    return token['content'], role['value']
+
+
+def get_session(host=None, logname=None):
+    """Return the shared :class:`LookupSession` for ``host``"""
+    host = host if host else DEFAULT_HOST
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = LookupSession(host, logname=logname)
+            _sessions[host] = session
+    return session
+
+
+def carrier_lookup(number, logname=None, host=None):
+    return CarrierLookup(number, logname=logname, host=host).lookup()
+
+
+class LookupSession(object):
+    """Keep-alive session to the lookup host with a cached csrf/sid pair
+
+    The csrf token and visitor sid scraped from the lookup page are reused
+    for ``ttl`` seconds and only refreshed on expiry or when the lookup
+    host answers 403, so a lookup is usually a single POST over an already
+    open connection. ``token_hits`` and ``token_refreshes`` count how the
+    token pair was obtained.
+    """
+    def __init__(self, host=None, ttl=TOKEN_TTL, logname=None):
+        self.host = host if host else DEFAULT_HOST
+        self.ttl = ttl
         self._logname = logname if logname else ''
         self.log = logging.getLogger(self._logname)
+        self.token_hits = 0
+        self.token_refreshes = 0
+        self._tokens = None
+        self._expires = 0
+        self._lock = threading.Lock()
+        self.session = self._new_session()
 
-    def lookup(self):
-        log = self.log
+    @property
+    def lookup_url(self):
+        return '{0}/lookup'.format(self.host)
 
-        domain = 'www.twilio.com'
-        host = 'https://{0}'.format(domain)
-        lookup = '{0}/lookup'.format(host)
+    def _new_session(self):
+        domain = self.host.split('://', 1)[-1]
 
         # masquerade as OS-X Firefox
         s = requests.Session()
@@ -34,11 +142,17 @@ class CarrierLookup(object):
         s.headers['content-type'] = 'application/x-www-form-urlencoded; charset=UTF-8'
         s.headers['host'] = domain
         s.headers['DNT'] = '1'
-        s.headers['connection'] = 'close'
+        s.headers['referer'] = self.lookup_url
+        return s
+
+    def _fetch_tokens(self):
+        log = self.log
+        s = self.session
+        lookup = self.lookup_url
 
         # fetch the base page to set the cookies and get csrf and sid values
         r = s.get(lookup)
-        hdrs = {k: v for k, v in s.headers.iteritems()}
+        hdrs = {k: v for k, v in items(s.headers)}
         cookies = [{c.name: c.value} for c in s.cookies]
         log.debug('\nsession headers: {0}\n'.format(jsonify(hdrs)))
         log.debug('\nsession cookies: {0}\n'.format(jsonify(cookies)))
@@ -49,27 +163,184 @@ class CarrierLookup(object):
             raise ValueError()
 
         # extract the csrf and sid
-        page = htmldoc(r.text)
-        token = page.find('meta', attrs={'name': 'csrfToken'})
-        if token is None:
-            log.debug(r.text)
-        csrf = token['content']
-        log.debug('NAME={0} CONTENT={1}'.format(token['name'], csrf))
-        sid_attrs = {'type': 'hidden', 'role': 'visitorSid'}
-        role = page.find('input', attrs=sid_attrs)
-        sid = role['value']
-        log.debug('ROLE={0} VALUE={1}'.format(role['role'], sid))
-
-        # retrieve the phone number information
-        s.headers['referer'] = lookup
+        try:
+            csrf, sid = extract_tokens(r.text)
+        except ValueError:
+            if _htmldoc() is None:
+                log.debug(r.text)
+                raise
+            log.debug('falling back to BeautifulSoup token extraction')
+            csrf, sid = extract_tokens_soup(r.text)
+        log.debug('csrfToken={0} visitorSid={1}'.format(csrf, sid))
+        return csrf, sid
+
+    def tokens(self, stale=None):
+        """Return the cached ``(csrf, sid)`` pair, refreshing it if needed
+
+        Passing the pair that was rejected as ``stale`` forces a refresh
+        unless another caller has already replaced it.
+        """
+        with self._lock:
+            expired = time.time() >= self._expires
+            if self._tokens is None or expired or self._tokens == stale:
+                self._tokens = self._fetch_tokens()
+                self._expires = time.time() + self.ttl
+                self.token_refreshes += 1
+            else:
+                self.token_hits += 1
+            return self._tokens
+
+    def _post(self, number, tokens):
+        csrf, sid = tokens
         params = {
             'Type': 'lookup',
-            'PhoneNumber': "{0}".format(self.number),
+            'PhoneNumber': "{0}".format(number),
             'VisitorSid': sid,
             'CSRF': csrf,
         }
-        log.debug('\nparams: {0}\n'.format(jsonify(params)))
-        url = '{0}/functional-demos'.format(host)
-        r = s.post(url, params=params)
-        info = json.loads(r.content)
-        return info
+        self.log.debug('\nparams: {0}\n'.format(jsonify(params)))
+        url = '{0}/functional-demos'.format(self.host)
+        return self.session.post(url, params=params)
+
+    def lookup(self, number):
+        tokens = self.tokens()
+        r = self._post(number, tokens)
+        if r.status_code == 403:
+            self.log.debug('lookup tokens rejected, refreshing')
+            r = self._post(number, self.tokens(stale=tokens))
+        return json.loads(r.content)
+
+
+class CarrierLookup(object):
+    def __init__(self, number, logname=None, host=None, session=None):
+        self.number = number
+        self._logname = logname if logname else ''
+        self.log = logging.getLogger(self._logname)
+        self.host = host if host else DEFAULT_HOST
+        self._session = session
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = get_session(self.host, self._logname)
+        return self._session
+
+    def lookup(self):
+        return self.session.lookup(self.number)
+
+
+class RateLimiter(object):
+    """Thread-safe limiter spacing calls ``1 / rate`` seconds apart"""
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.time()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+_RETRY_ERRORS = (requests.RequestException, ValueError, KeyError, TypeError)
+_DONE = object()
+# seconds between checks of the stop event by blocked threads
+_POLL = 0.1
+
+
+def lookup_many(numbers, concurrency=4, rate=None, retries=2, backoff=0.5,
+                logname=None, host=None):
+    """Look up many numbers on a bounded pool of worker threads
+
+    Yields ``(number, info, error)`` tuples as soon as each lookup
+    finishes (so not necessarily in input order); ``error`` is the last
+    exception when every attempt failed, otherwise None. At most
+    ``concurrency`` lookups run at once and ``rate`` caps the requests
+    per second sent to the lookup host. Failed attempts are retried
+    ``retries`` times with exponential ``backoff``. An error raised while
+    iterating ``numbers`` is re-raised once the started lookups are done;
+    closing the generator early stops the remaining lookups.
+    """
+    log = logging.getLogger(logname if logname else '')
+    limiter = RateLimiter(rate)
+    pending = queue.Queue(maxsize=concurrency * 2)
+    results = queue.Queue()
+    stop = threading.Event()
+    failed = []
+
+    def attempt(number):
+        error = None
+        for tries in range(retries + 1):
+            if tries:
+                if stop.is_set():
+                    break
+                time.sleep(backoff * 2 ** (tries - 1))
+                log.debug('retrying lookup for {0}: {1!r}'.format(
+                    number, error))
+            limiter.wait()
+            try:
+                return carrier_lookup(number, logname, host), None
+            except _RETRY_ERRORS as e:
+                error = e
+        return None, error
+
+    def worker():
+        try:
+            while not stop.is_set():
+                try:
+                    number = pending.get(timeout=_POLL)
+                except queue.Empty:
+                    continue
+                if number is _DONE:
+                    return
+                try:
+                    info, error = attempt(number)
+                except Exception as e:
+                    info, error = None, e
+                results.put((number, info, error))
+        finally:
+            results.put(_DONE)
+
+    def put(item):
+        # give up once the consumer has gone away
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=_POLL)
+            except queue.Full:
+                continue
+            return True
+        return False
+
+    def feeder():
+        try:
+            for number in numbers:
+                if not put(number):
+                    return
+        except Exception as e:
+            failed.append(e)
+        finally:
+            for _ in workers:
+                put(_DONE)
+
+    workers = [threading.Thread(target=worker) for _ in range(concurrency)]
+    threads = workers + [threading.Thread(target=feeder)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    running = len(workers)
+    try:
+        while running:
+            result = results.get()
+            if result is _DONE:
+                running -= 1
+                continue
+            yield result
+    finally:
+        stop.set()
+    if failed:
+        raise failed[0]
@@ -0,0 +1,106 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import sys
+
+_FORMATTING = '()- '
+_STRIP_TABLE = dict((ord(c), None) for c in _FORMATTING)
+_NUMBER_ERROR = 'phone number is not 10 digits'
+# text type (unicode on Python 2)
+_TEXT = type('')
+
+
+def normalize_number(number):
+    """Strip formatting from a 10 digit US/CA phone number
+
+    Raises ValueError if what remains is not exactly 10 digits.
+    """
+    num = number.strip().translate(_STRIP_TABLE)
+    if len(num) != 10 or not num.isdigit():
+        raise ValueError(_NUMBER_ERROR)
+    return num
+
+
+def _normalize_list(values):
+    numbers = []
+    rejected = []
+    for value in values:
+        try:
+            num = normalize_number(value)
+        except (ValueError, AttributeError, TypeError):
+            num = ''
+        numbers.append(num)
+        rejected.append(not num)
+    return numbers, rejected
+
+
+def _normalize_array(values):
+    """Vectorized normalization of an array of text
+
+    Works on the UCS-4 code points of a fixed width ``U`` array: rows made
+    only of digits and ``()- `` with exactly 10 digits are compacted with a
+    single boolean mask; rows with any other character, and items of other
+    arrays that are not text, take the per-item path so results always
+    match :func:`normalize_number`.
+    """
+    np = sys.modules['numpy']
+    values = np.asarray(values)
+    items = text = None
+    if values.dtype.kind != 'U':
+        # e.g. ints in an object column, their digits would pass the mask
+        items = values.astype(object).ravel()
+        text = np.array(
+            [isinstance(item, _TEXT) for item in items.tolist()], dtype=bool)
+        values = items.copy()
+        values[~text] = ''
+        values = values.astype('U')
+    values = np.ascontiguousarray(values.ravel())
+    size = len(values)
+    width = values.dtype.itemsize // 4
+    numbers = np.zeros(size, dtype='U10')
+    rejected = np.ones(size, dtype=bool)
+    if not size or not width:
+        return numbers, rejected
+    codes = values.view(np.uint32).reshape(size, width)
+    digit = (codes >= ord('0')) & (codes <= ord('9'))
+    allowed = digit | (codes == 0)
+    for char in _FORMATTING:
+        allowed |= codes == ord(char)
+    simple = allowed.all(axis=1)
+    if text is not None:
+        simple &= text
+    valid = simple & (digit.sum(axis=1) == 10)
+    if valid.any():
+        # each valid row holds exactly 10 digits, in row-major order
+        packed = codes[valid][digit[valid]].reshape(-1, 10)
+        numbers[valid] = packed.view('U10').ravel()
+        rejected[valid] = False
+    for i in np.flatnonzero(~simple):
+        item = values[i] if items is None else items[i]
+        num = _normalize_list([item])[0][0]
+        numbers[i] = num
+        rejected[i] = not num
+    return numbers, rejected
+
+
+def normalize_numbers(values):
+    """Normalize and validate many 10 digit US/CA phone numbers at once
+
+    ``values`` may be any iterable of strings, a NumPy array or a pandas
+    Series. Returns ``(numbers, rejected)``: the normalized numbers (an
+    empty string where rejected) and a boolean rejection mask, as lists
+    for iterables, arrays for NumPy input and Series sharing the index of
+    a pandas input. NumPy input is processed with array operations.
+    """
+    # an array or Series means numpy/pandas are already imported
+    pd = sys.modules.get('pandas')
+    np = sys.modules.get('numpy')
+    if pd is not None and isinstance(values, pd.Series):
+        numbers, rejected = _normalize_array(values.to_numpy(dtype=object))
+        return (
+            pd.Series(numbers, index=values.index, name=values.name),
+            pd.Series(rejected, index=values.index, name=values.name),
+        )
+    if np is not None and isinstance(values, np.ndarray):
+        return _normalize_array(values)
+    return _normalize_list(values)
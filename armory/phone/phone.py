@@ -2,52 +2,56 @@
 from __future__ import absolute_import
 
 import logging
-import smtplib
-
-from armory.phone.lookup import carrier_lookup
+from armory.phone.normalize import normalize_number
+from armory.phone.segment import segment_message
 from armory.serialize import jsonify
 
 
 class PhoneNumber(object):
-    """lookup country code and carrier for a phone number"""
-    def __init__(self, phonenumber=None, data=None, logger=None, comment=None):
+    """lookup country code and carrier for a phone number
+
+    Pass a :class:`armory.phone.cache.LookupCache` as ``cache`` to serve
+    lookups from it instead of always contacting the lookup host.
+    """
+    __slots__ = (
+        '_logger', 'log', '_cache', '_raw', '_carrier', '_type', '_comment',
+        '_unpacked', 'number',
+    )
+
+    def __init__(self, phonenumber=None, data=None, logger=None, comment=None,
+                 cache=None):
         self._logger = logger if logger else ''
         self.log = logging.getLogger(self._logger)
+        self._cache = cache
         self._raw = None
         self._carrier = None
         self._type = None
         self._comment = None
+        self._unpacked = False
         self.number = ''
         if data is not None:
             self._raw = data
             self._unpack()
         if phonenumber is not None:
-            num = phonenumber.strip()
-            num = num.replace('(', '')
-            num = num.replace(')', '')
-            num = num.replace('-', '')
-            num = num.replace(' ', '')
-            if len(num) != 10:
-                raise ValueError('phone number is not 10 digits')
-            self.number = num
+            self.number = normalize_number(phonenumber)
         if comment is not None:
             self._comment = comment
 
     @property
     def raw(self):
-        if not self._raw:
+        if not self._unpacked:
             self.lookup()
         return self._raw
 
     @property
     def carrier(self):
-        if not self._carrier:
+        if not self._unpacked:
             self.lookup()
         return self._carrier
 
     @property
     def type(self):
-        if not self._type:
+        if not self._unpacked:
             self.lookup()
         return self._type
 
@@ -62,11 +66,16 @@ class PhoneNumber(object):
         carrier = data.get('carrier')
         self._carrier = carrier.get('name')
         self._type = carrier.get('type')
+        self._unpacked = True
 
     def lookup(self):
         log = self.log
         try:
-            info = carrier_lookup(self.number, self._logger)
+            if self._cache is not None:
+                info = dict(self._cache.lookup(self.number))
+            else:
+                from armory.phone.lookup import carrier_lookup
+                info = carrier_lookup(self.number, self._logger)
         except ValueError:
             raise SystemExit()
         log.debug(jsonify(info))
@@ -98,10 +107,16 @@ class EmailSMS(object):
             self._smtp.quit()
         self._smtp = None
 
+    def _connect(self):
+        # smtplib pulls in the email package, only import it to send
+        import smtplib
+        smtp = smtplib.SMTP(self._server)
+        smtp.starttls()
+        smtp.login(self._smtp_user, self._passcode)
+        return smtp
+
     def _initialize_smtp(self):
-        self._smtp = smtplib.SMTP(self._server)
-        self._smtp.starttls()
-        self._smtp.login(self._smtp_user, self._passcode)
+        self._smtp = self._connect()
 
     @property
     def smtp(self):
@@ -110,8 +125,59 @@ class EmailSMS(object):
         return self._smtp
 
     def send(self, recipient, message):
-        self.smtp.sendmail(self._sender, recipient, message)
+        """Send ``message``, split into numbered parts if over SMS size"""
+        from armory.phone.delivery import encode_message
+        smtp = self.smtp
+        for part in segment_message(message):
+            smtp.sendmail(self._sender, recipient, encode_message(part))
         self.log.info('sender: {0}'.format(self._sender))
         self.log.info('recipient: {0}'.format(recipient))
         self.log.info('message: "{0}"'.format(message))
         self.log.info('')
+
+    def pool(self, connections=4, max_messages=None, retries=2):
+        """Return an :class:`armory.phone.delivery.SMTPPool` for this login
+
+        The pool keeps its connections open between deliveries until it is
+        closed; pass it to :meth:`send_many` to reuse them.
+        """
+        from armory.phone import delivery
+        max_messages = max_messages if max_messages else delivery.MAX_MESSAGES
+        return delivery.SMTPPool(
+            self._connect, size=connections, max_messages=max_messages,
+            retries=retries, logname=self.log.name)
+
+    def send_many(self, recipients, message, connections=4,
+                  max_messages=None, retries=2, max_recipients=None,
+                  pool=None):
+        """Send ``message`` to every recipient over a pool of connections
+
+        Recipients are deduplicated and grouped by gateway domain into
+        transactions of up to ``max_recipients`` addresses (defaults from
+        :mod:`armory.phone.delivery`). Long messages
+        are segmented once and all parts for a group go out back to back
+        over the same connection. A ``pool`` from :meth:`pool` is used and
+        left open, otherwise one is opened for this call and closed after.
+        Returns the :class:`armory.phone.delivery.DeliveryReport`; a failed
+        recipient does not stop delivery to the others.
+        """
+        from armory.phone import delivery
+        parts = tuple(segment_message(message))
+        groups = delivery.group_recipients(
+            recipients,
+            max_recipients if max_recipients else delivery.MAX_RECIPIENTS)
+        messages = ((self._sender, group, parts) for group in groups)
+        if pool is not None:
+            report = pool.deliver(messages)
+        else:
+            with self.pool(connections, max_messages, retries) as pool:
+                report = pool.deliver(messages)
+        # failures are in the report, callers decide how to show them
+        for result in report.failed:
+            self.log.debug('failed to send to {0}: {1!r}'.format(
+                result.recipient, result.error))
+        self.log.info('sender: {0}'.format(self._sender))
+        self.log.info('message: "{0}"'.format(message))
+        self.log.info('sent {0} of {1} messages in {2:.2f}s'.format(
+            len(report.sent), len(report.results), report.elapsed))
+        return report
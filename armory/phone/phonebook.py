@@ -0,0 +1,221 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import bisect
+
+from array import array
+
+from armory.phone.normalize import normalize_number
+from armory.utils.builtins import items
+
+
+def _pack(number):
+    if isinstance(number, int):
+        return number
+    return int(normalize_number(number))
+
+
+def _unpack_raw(raw):
+    carrier = (raw.get('body') or {}).get('carrier') or {}
+    return carrier.get('name'), carrier.get('type')
+
+
+class _Labels(object):
+    """Interned strings stored as small integer codes (0 is None)"""
+    __slots__ = ('values', 'codes')
+
+    def __init__(self):
+        self.values = [None]
+        self.codes = {None: 0}
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+
+class PhoneEntry(object):
+    """Lightweight read-only view of one :class:`PhoneBook` entry
+
+    The view keeps its number and finds the entry again whenever the book
+    has been re-sorted since, so it stays valid across :meth:`PhoneBook.add`.
+    """
+    __slots__ = ('_book', '_packed', '_index', '_version')
+
+    def __init__(self, book, index):
+        self._book = book
+        self._packed = book._numbers[index]
+        self._index = index
+        self._version = book._version
+
+    @property
+    def _position(self):
+        book = self._book
+        if not book._sorted:
+            book._sort()
+        if self._version != book._version:
+            self._index = book._find(self._packed)
+            self._version = book._version
+        return self._index
+
+    @property
+    def number(self):
+        return '{0:010d}'.format(self._packed)
+
+    @property
+    def carrier(self):
+        # find the position first, it may re-sort (replace) the columns
+        index = self._position
+        return self._book._carriers.values[self._book._carrier_codes[index]]
+
+    @property
+    def type(self):
+        index = self._position
+        return self._book._types.values[self._book._type_codes[index]]
+
+    @property
+    def raw(self):
+        index = self._position
+        if self._book._raw is None:
+            return None
+        return self._book._raw[index]
+
+    def to_phone(self, **kwargs):
+        """Return a full :class:`armory.phone.phone.PhoneNumber`"""
+        from armory.phone.phone import PhoneNumber
+        phone = PhoneNumber(self.number, **kwargs)
+        phone._raw = self.raw
+        phone._carrier = self.carrier
+        phone._type = self.type
+        phone._unpacked = True
+        return phone
+
+    def __repr__(self):
+        return '<PhoneEntry: {0} {1}/{2}>'.format(
+            self.number, self.carrier, self.type)
+
+
+class PhoneBook(object):
+    """Compact roster of phone numbers for large in-memory collections
+
+    Numbers are packed as 64-bit integers in an :class:`array.array`,
+    carrier and type names are interned as 16-bit codes and the raw lookup
+    payload is only kept when ``keep_raw`` is set. Entries are kept sorted
+    by number (lazily, after additions) so membership is a binary search;
+    adding an existing number replaces its entry. Iteration and
+    :meth:`filter` yield :class:`PhoneEntry` views.
+    """
+    def __init__(self, keep_raw=False):
+        self._numbers = array('q')
+        self._carrier_codes = array('H')
+        self._type_codes = array('H')
+        self._carriers = _Labels()
+        self._types = _Labels()
+        self._raw = [] if keep_raw else None
+        self._sorted = True
+        # bumped whenever entries move, see PhoneEntry
+        self._version = 0
+
+    @classmethod
+    def from_lookups(cls, lookups, keep_raw=False):
+        """Build from a mapping of number -> raw lookup payload"""
+        book = cls(keep_raw=keep_raw)
+        for number, raw in items(lookups):
+            carrier, ptype = _unpack_raw(raw)
+            book.add(number, carrier, ptype, raw=raw)
+        return book
+
+    def add(self, number, carrier=None, type=None, raw=None):
+        packed = _pack(number)
+        numbers = self._numbers
+        if self._sorted and numbers and packed <= numbers[-1]:
+            self._sorted = False
+        numbers.append(packed)
+        self._carrier_codes.append(self._carriers.code(carrier))
+        self._type_codes.append(self._types.code(type))
+        if self._raw is not None:
+            self._raw.append(raw)
+
+    def add_phone(self, phone):
+        """Add an :class:`armory.phone.phone.PhoneNumber` (no lookup)"""
+        self.add(phone.number, phone._carrier, phone._type, raw=phone._raw)
+
+    def _sort(self):
+        """Sort all columns by number, keeping the last added duplicate"""
+        numbers = self._numbers
+        order = sorted(range(len(numbers)), key=numbers.__getitem__)
+        keep = [
+            i for pos, i in enumerate(order)
+            if pos + 1 == len(order) or numbers[order[pos + 1]] != numbers[i]
+        ]
+        self._numbers = array('q', (numbers[i] for i in keep))
+        self._carrier_codes = array(
+            'H', (self._carrier_codes[i] for i in keep))
+        self._type_codes = array('H', (self._type_codes[i] for i in keep))
+        if self._raw is not None:
+            self._raw = [self._raw[i] for i in keep]
+        self._sorted = True
+        self._version += 1
+
+    def _find(self, number):
+        if not self._sorted:
+            self._sort()
+        packed = _pack(number)
+        index = bisect.bisect_left(self._numbers, packed)
+        if index < len(self._numbers) and self._numbers[index] == packed:
+            return index
+        return None
+
+    def __contains__(self, number):
+        try:
+            return self._find(number) is not None
+        except (TypeError, AttributeError, ValueError):
+            return False
+
+    def get(self, number, default=None):
+        index = self._find(number)
+        return default if index is None else PhoneEntry(self, index)
+
+    def __len__(self):
+        if not self._sorted:
+            self._sort()
+        return len(self._numbers)
+
+    def __iter__(self):
+        if not self._sorted:
+            self._sort()
+        for index in range(len(self._numbers)):
+            yield PhoneEntry(self, index)
+
+    @property
+    def carriers(self):
+        return [c for c in self._carriers.values if c is not None]
+
+    def filter(self, carrier=None, type=None):
+        """Yield entries matching the given carrier and/or type name"""
+        if not self._sorted:
+            self._sort()
+        checks = []
+        if carrier is not None:
+            code = self._carriers.codes.get(carrier)
+            if code is None:
+                return
+            checks.append((self._carrier_codes, code))
+        if type is not None:
+            code = self._types.codes.get(type)
+            if code is None:
+                return
+            checks.append((self._type_codes, code))
+        matches = None
+        for codes, code in checks:
+            hits = [i for i, c in enumerate(codes) if c == code]
+            if matches is not None:
+                hits = sorted(set(matches).intersection(hits))
+            matches = hits
+        if matches is None:
+            matches = range(len(self._numbers))
+        for index in matches:
+            yield PhoneEntry(self, index)
@@ -0,0 +1,113 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import bisect
+
+GSM7 = 'gsm7'
+UCS2 = 'ucs2'
+
+# GSM 03.38 default alphabet (less the escape) and its extension table,
+# whose characters take two septets (escape + character)
+_GSM_BASIC = frozenset(
+    '@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !"#¤%&\'()*+,-./0123456789:;<=>?'
+    '¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà'
+)
+_GSM_EXTENDED = frozenset('\x0c^{}\\[~]|€')
+
+# characters per single message, by encoding
+SMS_LIMITS = {GSM7: 160, UCS2: 70}
+_PART_PREFIX = '({0}/{1}) '
+# a part may end early at whitespace if that keeps it at least this full
+_MIN_FILL = 0.5
+
+
+def sms_encoding(text):
+    """Return the encoding a carrier will use for ``text``"""
+    for char in text:
+        if char not in _GSM_BASIC and char not in _GSM_EXTENDED:
+            return UCS2
+    return GSM7
+
+
+def _costs(text, encoding):
+    """Cumulative length in septets (GSM-7) or 16-bit units (UCS-2)"""
+    if encoding == GSM7:
+        extended = _GSM_EXTENDED
+        units = [2 if char in extended else 1 for char in text]
+    else:
+        units = [2 if ord(char) > 0xFFFF else 1 for char in text]
+    total = 0
+    cumulative = [0]
+    for unit in units:
+        total += unit
+        cumulative.append(total)
+    return cumulative
+
+
+def sms_length(text, encoding=None):
+    """Length of ``text`` as counted against the SMS limit"""
+    encoding = encoding if encoding else sms_encoding(text)
+    return _costs(text, encoding)[-1]
+
+
+def _split(text, cumulative, capacity):
+    boundaries = []
+    start = 0
+    size = len(text)
+    while start < size:
+        limit = cumulative[start] + capacity
+        end = bisect.bisect_right(cumulative, limit, start) - 1
+        if end <= start:
+            raise ValueError('SMS part capacity is too small')
+        if end < size and not text[end].isspace():
+            floor = cumulative[start] + capacity * _MIN_FILL
+            for i in range(end - 1, start, -1):
+                if cumulative[i] < floor:
+                    break
+                if text[i].isspace():
+                    end = i + 1
+                    break
+        boundaries.append((start, end))
+        start = end
+    return boundaries
+
+
+def segment_boundaries(text, encoding=None):
+    """Return the ``(start, end)`` slices of each part of ``text``
+
+    Boundaries are computed once from the cumulative length of ``text``
+    (extension characters and UCS-2 surrogate pairs count double and are
+    never split) with room left for the ``(i/n) `` part number; parts
+    prefer to end after whitespace. A message that fits a single SMS is
+    one slice.
+    """
+    encoding = encoding if encoding else sms_encoding(text)
+    cumulative = _costs(text, encoding)
+    limit = SMS_LIMITS[encoding]
+    if cumulative[-1] <= limit:
+        return [(0, len(text))]
+    count = 1
+    while True:
+        prefix = len(_PART_PREFIX.format(count, count))
+        boundaries = _split(text, cumulative, limit - prefix)
+        # the prefix width depends on the number of parts; resize until
+        # it is wide enough for the number of parts it produces
+        if len(str(len(boundaries))) <= len(str(count)):
+            return boundaries
+        count = len(boundaries)
+
+
+def segment_message(text, encoding=None):
+    """Split ``text`` into numbered SMS sized parts
+
+    Returns ``[text]`` when it fits a single message, otherwise each part
+    is prefixed with ``(i/n) `` so recipients can reassemble them in order.
+    """
+    boundaries = segment_boundaries(text, encoding)
+    if len(boundaries) == 1:
+        return [text]
+    total = len(boundaries)
+    return [
+        _PART_PREFIX.format(i, total) + text[start:end]
+        for i, (start, end) in enumerate(boundaries, 1)
+    ]
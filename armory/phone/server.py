@@ -0,0 +1,248 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import os
+import socket
+import threading
+
+from functools import partial
+
+try:
+    import socketserver
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    import SocketServer as socketserver
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from armory.serialize import jsonexpand, jsonify
+
+# PhoneService methods reachable through the socket and HTTP endpoints
+OPERATIONS = frozenset([
+    'ping', 'list_lookups', 'lookup', 'lookup_many', 'sms',
+])
+
+
+def _dispatch(service, request):
+    """Run one ``{"op": ..., "args": [...], "params": {...}}`` request"""
+    op = request.get('op')
+    try:
+        if op not in OPERATIONS:
+            raise ValueError('unknown operation: {0!r}'.format(op))
+        args = request.get('args') or ()
+        params = request.get('params') or {}
+        return {'ok': True, 'result': getattr(service, op)(*args, **params)}
+    except (ValueError, TypeError, KeyError) as e:
+        return {'ok': False, 'error': '{0}'.format(e)}
+    except Exception as e:
+        # keep serving other requests, e.g. when the lookup host is down
+        service.log.exception('{0} request failed'.format(op))
+        return {'ok': False, 'error': '{0!r}'.format(e)}
+
+
+class _SocketHandler(socketserver.StreamRequestHandler):
+    """Newline delimited JSON requests and responses"""
+    def handle(self):
+        service = self.server.service
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = jsonexpand(line.decode('utf-8'))
+            except ValueError as e:
+                response = {'ok': False, 'error': '{0}'.format(e)}
+            else:
+                response = _dispatch(service, request)
+            self.wfile.write(jsonify(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _HTTPHandler(BaseHTTPRequestHandler):
+    """``POST /<operation>`` with the params as a JSON object body
+
+    ``GET /lookups`` is a shortcut for ``POST /list_lookups``. Requests
+    must name this server in their ``Host`` header and POSTs must be sent
+    as ``application/json``: a web page can neither set that content type
+    on a cross-origin request without a preflight nor rebind its own host
+    name to this port, so browsers cannot be used to reach the service.
+    """
+    def _refuse(self):
+        """Reply with an error unless the request may reach the service"""
+        port = self.server.server_address[1]
+        hosts = ['{0}:{1}'.format(host, port)
+                 for host in ('127.0.0.1', 'localhost')]
+        if (self.headers.get('Host') or '').lower() not in hosts:
+            self.send_error(403, 'unexpected Host header')
+            return True
+        return False
+
+    def _respond(self, response):
+        body = jsonify(response).encode('utf-8')
+        self.send_response(200 if response['ok'] else 400)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', '{0}'.format(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self._refuse():
+            return
+        if self.path.rstrip('/') != '/lookups':
+            self.send_error(404)
+            return
+        self._respond(_dispatch(self.server.service, {'op': 'list_lookups'}))
+
+    def do_POST(self):
+        if self._refuse():
+            return
+        ctype = (self.headers.get('Content-Type') or '').split(';')[0]
+        if ctype.strip().lower() != 'application/json':
+            self.send_error(415, 'requests must be application/json')
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        rawbody = self.rfile.read(length).decode('utf-8')
+        try:
+            params = jsonexpand(rawbody) if rawbody.strip() else {}
+        except ValueError as e:
+            self._respond({'ok': False, 'error': '{0}'.format(e)})
+            return
+        op = self.path.strip('/')
+        request = {'op': op, 'params': params}
+        self._respond(_dispatch(self.server.service, request))
+
+    def log_message(self, format, *args):
+        self.server.log.debug(format % args)
+
+
+class _HTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class PhoneServer(object):
+    """Serve a :class:`armory.phone.service.PhoneService` to local clients
+
+    Requests arrive on the Unix socket at ``socket_path`` and, when
+    ``http_port`` is given, as JSON over HTTP on ``127.0.0.1`` so bulk
+    lookups can be submitted by other tools. The service (and with it the
+    cache, gateway index and network sessions) lives as long as the
+    server, so a request costs one local round trip.
+    """
+    def __init__(self, service, socket_path, http_port=None, logger=None):
+        self.service = service
+        self.socket_path = socket_path
+        self.http_port = http_port
+        self.log = logging.getLogger(logger if logger else __name__)
+        self._servers = []
+
+    def _bind(self):
+        path = self.socket_path
+        if os.path.exists(path):
+            if PhoneClient.available(path):
+                raise ValueError(
+                    'a server is already listening on {0}'.format(path))
+            os.unlink(path)
+        unix = _UnixServer(path, _SocketHandler)
+        unix.service = self.service
+        self.log.info('listening on {0}'.format(path))
+        if self.http_port is not None:
+            try:
+                address = ('127.0.0.1', self.http_port)
+                http = _HTTPServer(address, _HTTPHandler)
+            except socket.error:
+                unix.server_close()
+                os.unlink(path)
+                raise
+            http.service = self.service
+            http.log = self.log
+            self.http_port = http.server_address[1]
+            self.log.info('accepting HTTP requests on http://{0}:{1}'.format(
+                *http.server_address))
+            self._servers = [unix, http]
+        else:
+            self._servers = [unix]
+
+    def serve_forever(self):
+        """Serve until :meth:`shutdown` is called (or KeyboardInterrupt)"""
+        self._bind()
+        threads = [
+            threading.Thread(target=server.serve_forever)
+            for server in self._servers[1:]
+        ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            self._servers[0].serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def shutdown(self):
+        for server in self._servers:
+            server.shutdown()
+
+    def close(self):
+        for server in self._servers[1:]:
+            server.shutdown()
+        for server in self._servers:
+            server.server_close()
+        self._servers = []
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.service.close()
+
+
+class PhoneClient(object):
+    """Thin client forwarding :class:`PhoneService` calls to a server
+
+    Operations are available as methods taking the same keyword arguments
+    as the service; a failed request raises ValueError.
+    """
+    def __init__(self, socket_path, timeout=None):
+        self.socket_path = socket_path
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(socket_path)
+        self._rfile = self._sock.makefile('rb')
+
+    @classmethod
+    def available(cls, socket_path):
+        """True if a server is accepting connections on ``socket_path``"""
+        if not os.path.exists(socket_path):
+            return False
+        try:
+            cls(socket_path, timeout=1).close()
+        except socket.error:
+            return False
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._rfile.close()
+        self._sock.close()
+
+    def __getattr__(self, name):
+        if name not in OPERATIONS:
+            raise AttributeError(name)
+        return partial(self.call, name)
+
+    def call(self, op, *args, **params):
+        request = {'op': op, 'args': args, 'params': params}
+        self._sock.sendall(jsonify(request).encode('utf-8') + b'\n')
+        line = self._rfile.readline()
+        if not line:
+            raise ValueError('connection closed by the server')
+        response = jsonexpand(line.decode('utf-8'))
+        if not response['ok']:
+            raise ValueError(response['error'])
+        return response['result']
@@ -0,0 +1,263 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import socket
+import threading
+
+from armory.phone.gateways import get_resolver
+from armory.phone.normalize import normalize_number
+from armory.phone.phone import EmailSMS, PhoneNumber
+from armory.phone.segment import segment_message
+from armory.utils.builtins import items
+
+
+def _summary(number, data):
+    body = data.get('body') or {}
+    carrier = body.get('carrier') or {}
+    return {
+        'number': number,
+        'comment': data.get('comment'),
+        'national_format': body.get('national_format'),
+        'carrier': carrier.get('name'),
+        'type': carrier.get('type'),
+        'sms': data.get('sms'),
+    }
+
+
+class PhoneService(object):
+    """The operations behind the ``phone`` commands
+
+    Holds the :class:`armory.phone.store.PhoneCache`, the gateway resolver,
+    an open SMTP connection and the SMTP pool used to message every number
+    so a long-lived process (``phone serve``) keeps them warm between
+    requests; the HTTP lookup session is shared
+    per process by :func:`armory.phone.lookup.get_session`. Remote lookups
+    go through ``lookup_cache`` (a :class:`armory.phone.cache.LookupCache`)
+    when given, so failures are cached too and processes sharing its disk
+    tier never repeat a lookup. Every method
+    takes and returns JSON serializable values and raises ValueError for
+    bad requests, so it can be called in-process or through
+    :class:`armory.phone.server.PhoneClient` alike.
+    """
+    def __init__(self, cache, gateways=None, logger=None,
+                 lookup_cache=None):
+        self.cache = cache
+        self.gateways = gateways
+        self.lookup_cache = lookup_cache
+        self.log = logging.getLogger(logger if logger else __name__)
+        self._lock = threading.RLock()
+        self._smtp_lock = threading.Lock()
+        self._smtp = None
+        self._smtp_login = None
+        self._pool = None
+        self._pool_key = None
+
+    def close(self):
+        with self._smtp_lock:
+            if self._smtp is not None:
+                self._smtp.__exit__(None, None, None)
+            self._smtp = None
+            if self._pool is not None:
+                self._pool.close()
+            self._pool = None
+        with self._lock:
+            self.cache.close()
+        if self.lookup_cache is not None:
+            self.lookup_cache.close()
+
+    def ping(self):
+        return 'pong'
+
+    def list_lookups(self):
+        """Return a summary of every cached lookup, resolving SMS gateways"""
+        resolver = get_resolver(self.gateways)
+        summaries = []
+        with self._lock:
+            lookups = self.cache.lookups
+            self.cache.store.refresh()
+            for number, data in items(lookups):
+                if 'sms' not in data:
+                    body = data.get('body') or {}
+                    carrier = (body.get('carrier') or {}).get('name')
+                    sms_address = resolver.sms_address(number, carrier)
+                    if sms_address is not None:
+                        data['sms'] = sms_address
+                        lookups[number] = data
+                summaries.append(_summary(number, data))
+        return summaries
+
+    def lookup(self, number, comment=None, cache=True):
+        """Return ``{'cached': bool, 'data': raw lookup}`` for ``number``"""
+        number = normalize_number(number)
+        lookups = self.cache.lookups
+        with self._lock:
+            if number not in lookups:
+                self.cache.store.refresh()
+            if number in lookups:
+                return {'number': number, 'cached': True,
+                        'data': lookups[number]}
+        if self.lookup_cache is not None:
+            # copied, the comment must not end up in the shared entry
+            data = dict(self.lookup_cache.lookup(number))
+        else:
+            from armory.phone.lookup import carrier_lookup
+            data = carrier_lookup(number)
+        PhoneNumber(number, data=data)
+        data['comment'] = comment
+        if cache:
+            with self._lock:
+                lookups[number] = data
+        return {'number': number, 'cached': False, 'data': data}
+
+    def lookup_many(self, numbers, comment=None, cache=True, concurrency=4,
+                    rate=None):
+        """Look up the uncached ``numbers`` concurrently
+
+        Returns one summary per number with ``cached`` and ``error`` set;
+        invalid numbers are reported with an error and not looked up.
+        """
+        results = []
+        pending = []
+        lookups = self.cache.lookups
+        with self._lock:
+            self.cache.store.refresh()
+            for raw in numbers:
+                try:
+                    number = normalize_number(raw)
+                except ValueError as e:
+                    results.append({'number': raw, 'error': '{0}'.format(e)})
+                    continue
+                if number in lookups:
+                    result = _summary(number, lookups[number])
+                    result.update(cached=True, error=None)
+                    results.append(result)
+                elif number not in pending:
+                    pending.append(number)
+        for number, data, err in self._lookup_many(
+                pending, concurrency, rate):
+            if err is None:
+                try:
+                    PhoneNumber(number, data=data)
+                except ValueError as e:
+                    err = e
+            if err is not None:
+                results.append({'number': number, 'error': repr(err)})
+                continue
+            data['comment'] = comment
+            if cache:
+                with self._lock:
+                    lookups[number] = data
+            result = _summary(number, data)
+            result.update(cached=False, error=None)
+            results.append(result)
+        return results
+
+    def _lookup_many(self, numbers, concurrency, rate):
+        """Yield ``(number, data, error)``, from ``lookup_cache`` if fresh"""
+        from armory.phone.lookup import lookup_many
+        cached = self.lookup_cache
+        remote = []
+        for number in numbers:
+            entry = cached.get(number) if cached is not None else None
+            if entry is None:
+                remote.append(number)
+            elif entry['ok']:
+                yield number, dict(entry['info']), None
+            else:
+                yield number, None, ValueError(
+                    'lookup failed for {0}: {1}'.format(
+                        number, entry['info']))
+        found = lookup_many(remote, concurrency=concurrency, rate=rate)
+        for number, data, err in found:
+            if cached is not None:
+                if err is None:
+                    cached.put(number, data)
+                    data = dict(data)
+                elif isinstance(err, ValueError):
+                    cached.put(number, error=err)
+            yield number, data, err
+
+    def _gateway(self, smtp_login):
+        """Return the open single connection gateway, (re)connecting"""
+        if self._smtp is not None and self._smtp_login != smtp_login:
+            self._smtp.__exit__(None, None, None)
+            self._smtp = None
+        if self._smtp is None:
+            self._smtp = EmailSMS(**smtp_login).__enter__()
+            self._smtp_login = smtp_login
+        return self._smtp
+
+    def _smtp_pool(self, smtp_login, connections):
+        """Return the open connection pool, replacing it on changes"""
+        with self._smtp_lock:
+            key = (smtp_login, connections)
+            if self._pool is not None and self._pool_key != key:
+                self._pool.close()
+                self._pool = None
+            if self._pool is None:
+                self._pool = EmailSMS(**smtp_login).pool(connections)
+                self._pool_key = key
+            return self._pool
+
+    def _send(self, smtp_login, recipient, message):
+        import smtplib
+        with self._smtp_lock:
+            try:
+                self._gateway(smtp_login).send(recipient, message)
+            except smtplib.SMTPServerDisconnected:
+                self._smtp = None
+                self._gateway(smtp_login).send(recipient, message)
+
+    def sms(self, message, numbers=None, send_all=False, connections=4,
+            batch=None):
+        """Send ``message`` to cached ``numbers`` (or all of them)
+
+        Returns the number of ``parts`` the message was split into and the
+        ``sent``, ``failed`` (with errors) and ``unknown`` recipients.
+        """
+        import smtplib
+        with self._lock:
+            self.cache.store.refresh()
+            smtp_login = self.cache.settings.get('smtp_login', None)
+            if smtp_login is None:
+                raise ValueError(
+                    'cannot send SMS messages until SMTP has been configured')
+            smtp_login = dict(smtp_login)
+            lookups = self.cache.lookups
+            if send_all:
+                targets = list(items(lookups))
+            else:
+                targets = [(num, lookups.get(num)) for num in numbers or ()]
+        result = {
+            'parts': len(segment_message(message)),
+            'sent': [],
+            'failed': [],
+            'unknown': [],
+        }
+        recipients = []
+        for num, data in targets:
+            if not data or not data.get('sms'):
+                result['unknown'].append(num)
+            else:
+                recipients.append(data['sms'])
+        if send_all:
+            report = EmailSMS(**smtp_login).send_many(
+                recipients, message, max_recipients=batch,
+                pool=self._smtp_pool(smtp_login, connections))
+            result['sent'] = [r.recipient for r in report.sent]
+            result['failed'] = [
+                {'recipient': r.recipient, 'error': repr(r.error)}
+                for r in report.failed
+            ]
+            return result
+        for recipient in recipients:
+            try:
+                self._send(smtp_login, recipient, message)
+            except (smtplib.SMTPException, socket.error, UnicodeError) as e:
+                # reported to the caller, which decides how to show it
+                result['failed'].append(
+                    {'recipient': recipient, 'error': repr(e)})
+            else:
+                result['sent'].append(recipient)
+        return result
@@ -0,0 +1,373 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import io
+import logging
+import os
+import threading
+
+from contextlib import contextmanager
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from armory.serialize import jsonexpand, jsonify
+
+_SEP = b'\t'
+_EOL = b'\n'
+
+# superseded records tolerated before a write triggers a compaction
+COMPACT_STALE = 1000
+
+
+def _fsync_dir(path):
+    """Make a rename in the directory of ``path`` durable (POSIX only)"""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class LogStore(MutableMapping):
+    """Append-only key/value log with an in-memory offset index
+
+    Every record is a single line of ``<json key>\\t<json value>``; an
+    empty value marks a deletion. The index (key -> offset of the latest
+    record) is built lazily on first access by scanning only the keys, and
+    values are read from disk on demand, so ``get``/``put`` cost O(1)
+    regardless of the store size. Each ``put`` is one appended line which
+    is flushed and fsync'd; a torn trailing line from a crash is ignored
+    and cut off by the next writer. :meth:`refresh` indexes records
+    appended by other processes since the last scan. :meth:`compact`
+    rewrites only the live records into a temporary file which atomically
+    replaces the log, and runs automatically once more than
+    ``autocompact`` superseded records outnumber the live ones.
+
+    Several processes (and threads) may share one store: writers hold an
+    exclusive ``flock`` on ``<path>.lock`` (readers a shared one) where
+    :mod:`fcntl` is available, and a log replaced by another process's
+    compaction is reopened and reindexed.
+    """
+    def __init__(self, path, logger=None, autocompact=COMPACT_STALE):
+        self.path = path
+        self.log = logging.getLogger(logger if logger else __name__)
+        self.autocompact = autocompact
+        self._fp = None
+        self._lockfd = None
+        self._index = None
+        self._stale = 0
+        self._scanned = 0
+        self._depth = 0
+        self._mutex = threading.RLock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self._mutex:
+            if self._fp is not None:
+                self._fp.close()
+            if self._lockfd is not None:
+                os.close(self._lockfd)
+            self._fp = None
+            self._lockfd = None
+            self._index = None
+
+    @property
+    def fp(self):
+        if self._fp is None:
+            self._fp = io.open(self.path, 'ab+')
+        return self._fp
+
+    @property
+    def index(self):
+        if self._index is None:
+            self.refresh()
+        return self._index
+
+    @property
+    def stale(self):
+        """Number of superseded or deletion records held in the log"""
+        self.refresh()
+        return self._stale
+
+    def _replaced(self):
+        """True if another process swapped the log file under our handle"""
+        if self._fp is None:
+            return False
+        try:
+            current = os.stat(self.path)
+        except OSError:
+            return True
+        opened = os.fstat(self._fp.fileno())
+        return (current.st_ino, current.st_dev) != (
+            opened.st_ino, opened.st_dev)
+
+    @contextmanager
+    def _locked(self, exclusive=False):
+        with self._mutex:
+            if self._depth:
+                # already held by this thread (possibly exclusively)
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+            if fcntl is not None:
+                if self._lockfd is None:
+                    self._lockfd = os.open(
+                        '{0}.lock'.format(self.path),
+                        os.O_RDWR | os.O_CREAT, 0o644)
+                mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+                fcntl.flock(self._lockfd, mode)
+            self._depth += 1
+            try:
+                if self._replaced():
+                    self.log.debug('{0} was replaced, reopening'.format(
+                        self.path))
+                    self._fp.close()
+                    self._fp = None
+                    self._index = None
+                yield
+            finally:
+                self._depth -= 1
+                if fcntl is not None:
+                    fcntl.flock(self._lockfd, fcntl.LOCK_UN)
+
+    def refresh(self):
+        """Index records appended (e.g. by other processes) since last scan"""
+        with self._locked():
+            if self._index is None:
+                self._index = {}
+                self._stale = 0
+                self._scanned = 0
+            self._scan()
+
+    def _scan(self):
+        index = self._index
+        stale = self._stale
+        fp = self.fp
+        offset = self._scanned
+        fp.seek(offset)
+        for line in fp:
+            if not line.endswith(_EOL):
+                self.log.warning('ignoring incomplete record in {0}'.format(
+                    self.path))
+                break
+            rawkey, _, rawvalue = line.partition(_SEP)
+            try:
+                key = jsonexpand(rawkey.decode('utf-8'))
+            except ValueError:
+                self.log.warning('skipping corrupt record in {0}'.format(
+                    self.path))
+                offset += len(line)
+                continue
+            if key in index:
+                stale += 1
+            if rawvalue.strip():
+                index[key] = offset
+            else:
+                index.pop(key, None)
+                stale += 1
+            offset += len(line)
+        self._stale = stale
+        self._scanned = offset
+
+    def _read(self, offset):
+        fp = self.fp
+        fp.seek(offset)
+        return fp.readline()
+
+    def _repair(self, fp):
+        """Cut off a torn trailing line left behind by a crashed writer"""
+        end = fp.seek(0, io.SEEK_END)
+        if not end:
+            return
+        fp.seek(end - 1)
+        if fp.read(1) == _EOL:
+            return
+        chunk = min(end, io.DEFAULT_BUFFER_SIZE)
+        while True:
+            fp.seek(end - chunk)
+            data = fp.read(chunk)
+            cut = data.rfind(_EOL)
+            if cut >= 0 or chunk == end:
+                break
+            chunk = min(end, chunk * 2)
+        size = end - chunk + cut + 1
+        self.log.warning('truncating incomplete record in {0}'.format(
+            self.path))
+        fp.truncate(size)
+        if self._scanned > size:
+            self._scanned = size
+
+    def _append(self, key, value):
+        line = jsonify(key).encode('utf-8') + _SEP
+        if value is not None:
+            line += jsonify(value).encode('utf-8')
+        line += _EOL
+        fp = self.fp
+        self._repair(fp)
+        fp.write(line)
+        fp.flush()
+        os.fsync(fp.fileno())
+        end = fp.tell()
+        offset = end - len(line)
+        if offset == self._scanned:
+            self._scanned = end
+        return offset
+
+    def _maybe_compact(self):
+        limit = self.autocompact
+        if limit and self._stale > limit and self._stale > len(self._index):
+            self.compact()
+
+    def __getitem__(self, key):
+        with self._locked():
+            line = self._read(self.index[key])
+        rawvalue = line.partition(_SEP)[2]
+        return jsonexpand(rawvalue.decode('utf-8'))
+
+    def __setitem__(self, key, value):
+        if value is None:
+            raise ValueError('None is reserved for deletion records')
+        with self._locked(exclusive=True):
+            index = self.index
+            if key in index:
+                self._stale += 1
+            index[key] = self._append(key, value)
+            self._maybe_compact()
+
+    def __delitem__(self, key):
+        with self._locked(exclusive=True):
+            index = self.index
+            del index[key]
+            self._append(key, None)
+            self._stale += 2
+            self._maybe_compact()
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __iter__(self):
+        return iter(list(self.index))
+
+    def __len__(self):
+        return len(self.index)
+
+    def compact(self):
+        """Rewrite the log with only the live records (atomic rename)"""
+        tmppath = '{0}.compact'.format(self.path)
+        with self._locked(exclusive=True):
+            self.refresh()
+            offsets = sorted(self._index.values())
+            with io.open(tmppath, 'wb') as tmp:
+                for offset in offsets:
+                    tmp.write(self._read(offset))
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            os.rename(tmppath, self.path)
+            _fsync_dir(self.path)
+            self._fp.close()
+            self._fp = None
+            self._index = None
+
+
+class StoreView(MutableMapping):
+    """Mapping over the keys of a :class:`LogStore` sharing a namespace"""
+    def __init__(self, store, namespace):
+        self.store = store
+        self.namespace = namespace
+        self._prefix = '{0}:'.format(namespace)
+
+    def _key(self, key):
+        return self._prefix + key
+
+    def __getitem__(self, key):
+        return self.store[self._key(key)]
+
+    def __setitem__(self, key, value):
+        self.store[self._key(key)] = value
+
+    def __delitem__(self, key):
+        del self.store[self._key(key)]
+
+    def __contains__(self, key):
+        return self._key(key) in self.store
+
+    def __iter__(self):
+        size = len(self._prefix)
+        for key in self.store:
+            if key.startswith(self._prefix):
+                yield key[size:]
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class PhoneCache(object):
+    """Storage for the ``phone`` CLI: cached lookups and settings"""
+    def __init__(self, path, logger=None):
+        self.store = LogStore(path, logger=logger)
+        self.lookups = StoreView(self.store, 'lookups')
+        self.settings = StoreView(self.store, 'settings')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.store.close()
+
+    def compact(self):
+        self.store.compact()
+
+
+def is_legacy_json(path):
+    """True if ``path`` holds a legacy JSON document rather than a log
+
+    Log records start with their JSON encoded key, the legacy cache was a
+    single JSON object.
+    """
+    with io.open(path, 'rb') as fp:
+        head = fp.read(4096).lstrip()
+    return head.startswith(b'{')
+
+
+def migrate_json(json_path, cache):
+    """Import a legacy monolithic ``.phonecache`` JSON file into ``cache``
+
+    Returns the number of imported lookups.
+    """
+    with io.open(json_path, 'r', encoding='utf-8') as legacy:
+        rawdata = legacy.read()
+    if not rawdata.strip():
+        return 0
+    data = jsonexpand(rawdata)
+    lookups = data.pop('lookups', None) or {}
+    for number, record in lookups.items():
+        cache.lookups[number] = record
+    for key, value in data.items():
+        if value is not None:
+            cache.settings[key] = value
+    cache.compact()
+    return len(lookups)
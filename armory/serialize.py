@@ -3,23 +3,270 @@
 from __future__ import absolute_import, unicode_literals
 from __future__ import division, print_function
 
-import simplejson as json
+import codecs
+import importlib
+import json as stdjson
+import re
+import sys
 
-from collections import OrderedDict
+from collections import OrderedDict, deque, namedtuple
+from decimal import Decimal
+from functools import partial
+from threading import Lock
+
+_CHUNK_SIZE = 64 * 1024
+_BATCH_SIZE = 1000
+# batches in flight per process in jsonexpand_stream
+_WINDOW = 2
+_WHITESPACE = re.compile(r'\s*')
+
+# types simplejson serializes natively but the stdlib hands to ``default``
+_SIMPLEJSON_NATIVE = (Decimal,) if bytes is str else (Decimal, bytes)
+
+# simplejson (and _ALLOW_NAN, which depends on it) is only imported once a
+# backend is first needed
+_LAZY = ('simplejson', '_ALLOW_NAN')
+_LOADED = False
+_LOAD_LOCK = Lock()
 
 
 def _complex_encode(obj):
     return '{0}'.format(obj)
 
 
-def jsonify(data, pretty=False, **kwargs):
-    """Serialize Python objects to JSON with optional 'pretty' formatting
+def _reject_constant(name):
+    raise ValueError('{0} is not a valid JSON value'.format(name))
 
-    Raises:
-        TypeError: from :mod:`json` lib
-        ValueError: from :mod:`json` lib
-        JSONDecodeError: from :mod:`json` lib
+
+class JSONBackend(object):
+    """Adapter around a JSON library for :func:`jsonify`/:func:`jsonexpand`
+
+    Attributes:
+        ``encodes``: usable by :func:`jsonify` without changing its output
+        ``streams``: provides :meth:`iterencode` for :func:`jsonify_iter`
+        ``decodes``: usable by :func:`jsonexpand`
+        ``ordered``: supports ``object_pairs_hook`` style ordered decoding
+        ``options``: encoder keyword args understood (None means any)
+    """
+    name = None
+    encodes = False
+    streams = False
+    decodes = False
+    ordered = False
+    options = None
+
+    def encoder(self, **params):
+        """Return a reusable callable encoding data with ``params``"""
+        raise NotImplementedError()
+
+    def dumps(self, data, **params):
+        return self.encoder(**params)(data)
+
+    def iterencode(self, data, **params):
+        raise NotImplementedError()
+
+    def loads(self, data, ordered=False):
+        raise NotImplementedError()
+
+    def raw_decoder(self, ordered=False):
+        """Return a decoder object providing ``raw_decode(text, idx)``"""
+        raise NotImplementedError()
+
+    def __repr__(self):
+        return '<{0}: {1}>'.format(self.__class__.__name__, self.name)
+
+
+class SimpleJSONBackend(JSONBackend):
+    """The reference backend; defines the output contract of jsonify"""
+    name = 'simplejson'
+    encodes = True
+    streams = True
+    decodes = True
+    ordered = True
+
+    def encoder(self, **params):
+        return simplejson.JSONEncoder(**params).encode
+
+    def iterencode(self, data, **params):
+        return simplejson.JSONEncoder(**params).iterencode(data)
+
+    def loads(self, data, ordered=False):
+        if ordered:
+            return simplejson.loads(data, object_pairs_hook=OrderedDict)
+        return simplejson.loads(data)
+
+    def raw_decoder(self, ordered=False):
+        if ordered:
+            return simplejson.JSONDecoder(object_pairs_hook=OrderedDict)
+        return simplejson.JSONDecoder()
+
+
+class _StdlibDefault(object):
+    """``default`` hook giving the stdlib encoder simplejson semantics
+
+    ``for_json`` is honored for objects the stdlib does not serialize
+    natively and types simplejson would emit natively are converted.
+    """
+    def __init__(self, default, for_json):
+        self.default = default
+        self.for_json = for_json
+
+    def __call__(self, obj):
+        if self.for_json:
+            for_json = getattr(obj, 'for_json', None)
+            if callable(for_json):
+                return for_json()
+        if isinstance(obj, _SIMPLEJSON_NATIVE):
+            if isinstance(obj, Decimal):
+                return float(obj)
+            return obj.decode('utf-8')
+        if self.default is None:
+            raise TypeError('{0!r} is not JSON serializable'.format(obj))
+        return self.default(obj)
+
+
+class StdlibJSONBackend(JSONBackend):
+    """:mod:`json` from the standard library (uses its C accelerator)
+
+    Its decoder gives the same results as simplejson's. It only encodes when
+    simplejson is not installed: namedtuples (encoded as arrays instead of
+    objects) and ``for_json`` on list/dict subclasses never reach
+    ``default``, so it cannot keep the :func:`jsonify` output contract.
+    """
+    name = 'json'
+    encodes = True
+    streams = True
+    decodes = True
+    ordered = True
+    options = frozenset([
+        'skipkeys', 'ensure_ascii', 'check_circular', 'allow_nan',
+        'indent', 'separators', 'sort_keys', 'default', 'for_json',
+    ])
+
+    def _params(self, params):
+        params = dict(params)
+        params.setdefault('allow_nan', _ALLOW_NAN)
+        default = params.pop('default', None)
+        for_json = params.pop('for_json', False)
+        params['default'] = _StdlibDefault(default, for_json)
+        return params
+
+    def encoder(self, **params):
+        return stdjson.JSONEncoder(**self._params(params)).encode
+
+    def iterencode(self, data, **params):
+        encoder = stdjson.JSONEncoder(**self._params(params))
+        return encoder.iterencode(data)
+
+    def _decode_params(self, ordered):
+        params = {} if _ALLOW_NAN else {'parse_constant': _reject_constant}
+        if ordered:
+            params['object_pairs_hook'] = OrderedDict
+        return params
+
+    def loads(self, data, ordered=False):
+        return stdjson.loads(data, **self._decode_params(ordered))
+
+    def raw_decoder(self, ordered=False):
+        return stdjson.JSONDecoder(**self._decode_params(ordered))
+
+
+_BACKENDS = []
+_ENCODERS = ()
+_DECODERS = ()
+_ORDERED_DECODERS = ()
+_STREAMER = None
+
+
+def _refresh_backends():
+    global _ENCODERS, _DECODERS, _ORDERED_DECODERS, _STREAMER
+    _ENCODERS = tuple(b for b in _BACKENDS if b.encodes)
+    _DECODERS = tuple(b for b in _BACKENDS if b.decodes)
+    _ORDERED_DECODERS = tuple(b for b in _DECODERS if b.ordered)
+    # streams cannot fall back once output has started, prefer the reference
+    streams = [b for b in _BACKENDS if b.streams]
+    streams.sort(key=lambda b: not isinstance(b, SimpleJSONBackend))
+    _STREAMER = streams[0] if streams else None
+
+
+def register_backend(backend, index=None):
+    """Add a :class:`JSONBackend` to the dispatch order
+
+    The first backend able to handle a call is used, so ``index=0`` makes
+    ``backend`` preferred over every existing one; by default it is only
+    used when no earlier backend is capable.
     """
+    _ensure_backends()
+    if index is None:
+        _BACKENDS.append(backend)
+    else:
+        _BACKENDS.insert(index, backend)
+    _refresh_backends()
+    return backend
+
+
+def get_backends():
+    """Return the registered backends in dispatch order"""
+    _ensure_backends()
+    return tuple(_BACKENDS)
+
+
+def _optional(name):
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def _load_backends():
+    """Import the optional JSON libraries and register their backends"""
+    global simplejson, _ALLOW_NAN, _LOADED
+    with _LOAD_LOCK:
+        if _LOADED:
+            return
+        simplejson = _optional('simplejson')
+        # simplejson>=4 rejects NaN/Infinity by default, mirror it if present
+        _ALLOW_NAN = (
+            True if simplejson is None
+            else simplejson.JSONEncoder().allow_nan)
+        stdlib = StdlibJSONBackend()
+        stdlib.encodes = stdlib.streams = simplejson is None
+        defaults = [stdlib]
+        if simplejson is not None:
+            defaults.append(SimpleJSONBackend())
+        _BACKENDS[:0] = defaults
+        _refresh_backends()
+        _LOADED = True
+
+
+def _ensure_backends():
+    if not _LOADED:
+        _load_backends()
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        _load_backends()
+        return globals()[name]
+    raise AttributeError(
+        'module {0!r} has no attribute {1!r}'.format(__name__, name))
+
+
+if sys.version_info < (3, 7):
+    # no module level __getattr__ (PEP 562), load everything up front
+    _load_backends()
+
+
+def _encoder_for(kwargs):
+    _ensure_backends()
+    for backend in _ENCODERS:
+        if backend.options is None or backend.options.issuperset(kwargs):
+            return backend
+    # let the last resort raise its own TypeError for unknown options
+    return _ENCODERS[-1]
+
+
+def _jsonify_params(data, pretty, kwargs):
     isod = isinstance(data, OrderedDict)
     params = {
         'for_json': True,
@@ -29,13 +276,267 @@ def jsonify(data, pretty=False, **kwargs):
         params['indent'] = 2
         params['sort_keys'] = False if isod else True
     params.update(kwargs)
+    return params
+
+
+def _buffered(chunks, size):
+    """Coalesce the many small encoder chunks into ~``size`` sized pieces"""
+    buf = []
+    buflen = 0
+    for chunk in chunks:
+        buf.append(chunk)
+        buflen += len(chunk)
+        if buflen >= size:
+            yield ''.join(buf)
+            buf = []
+            buflen = 0
+    if buf:
+        yield ''.join(buf)
+
+
+def jsonify(data, pretty=False, **kwargs):
+    """Serialize Python objects to JSON with optional 'pretty' formatting
+
+    Raises:
+        TypeError: from :mod:`json` lib
+        ValueError: from :mod:`json` lib
+        JSONDecodeError: from :mod:`json` lib
+    """
+    params = _jsonify_params(data, pretty, kwargs)
+    return _dumps(_encoder_for(kwargs), data, params)
+
+
+def _dumps(backend, data, params):
+    try:
+        return backend.dumps(data, ensure_ascii=False, **params)
+    except UnicodeDecodeError:
+        return backend.dumps(data, **params)
+
+
+_PLAN_SIZE = 128
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class SchemaCache(object):
+    """Opt-in :func:`jsonify` that memoizes its prebuilt encoders
+
+    The encoder :func:`jsonify` builds only depends on ``pretty`` and, when
+    pretty, on whether keys keep their order (an OrderedDict), so one plan
+    is kept per combination and later calls skip the option handling,
+    backend dispatch and encoder construction. Payloads that cannot be
+    encoded by the plan are handed to :func:`jsonify`. Calls with extra
+    encoder options are never planned.
+    """
+    def __init__(self, maxsize=_PLAN_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._plans = OrderedDict()
+        self._lock = Lock()
+
+    def info(self):
+        with self._lock:
+            currsize = len(self._plans)
+        return CacheInfo(self.hits, self.misses, self.maxsize, currsize)
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def _signature(self, data, pretty):
+        # the only inputs of _jsonify_params besides the options
+        return (pretty, pretty and isinstance(data, OrderedDict))
+
+    def _compile(self, data, pretty):
+        params = _jsonify_params(data, pretty, {})
+        encode = _encoder_for({}).encoder(ensure_ascii=False, **params)
+        try:
+            return encode, encode(data)
+        except UnicodeDecodeError:
+            encode = partial(jsonify, pretty=pretty)
+            return encode, encode(data)
+
+    def jsonify(self, data, pretty=False, **kwargs):
+        if kwargs:
+            return jsonify(data, pretty=pretty, **kwargs)
+        signature = self._signature(data, pretty)
+        with self._lock:
+            plan = self._plans.pop(signature, None)
+            if plan is not None:
+                self.hits += 1
+                self._plans[signature] = plan
+            else:
+                self.misses += 1
+        if plan is None:
+            plan, result = self._compile(data, pretty)
+            with self._lock:
+                if len(self._plans) >= self.maxsize:
+                    self._plans.popitem(last=False)
+                self._plans[signature] = plan
+            return result
+        try:
+            return plan(data)
+        except UnicodeDecodeError:
+            return jsonify(data, pretty=pretty)
+
+
+def jsonify_iter(data, pretty=False, chunk_size=_CHUNK_SIZE, **kwargs):
+    """Serialize Python objects to JSON as a generator of text chunks
+
+    Accepts the same options as :func:`jsonify` but never holds the whole
+    document in memory; chunks are coalesced to roughly ``chunk_size``
+    characters. The ``ensure_ascii`` retry only applies before the first
+    chunk has been yielded.
+    """
+    params = _jsonify_params(data, pretty, kwargs)
+    _ensure_backends()
+    encode = _STREAMER.iterencode
+    chunks = _buffered(encode(data, ensure_ascii=False, **params), chunk_size)
     try:
-        return json.dumps(data, ensure_ascii=False, **params)
+        first = next(chunks)
     except UnicodeDecodeError:
-        return json.dumps(data, **params)
+        chunks = _buffered(encode(data, **params), chunk_size)
+        first = next(chunks)
+    yield first
+    for chunk in chunks:
+        yield chunk
+
+
+def jsonify_to(data, fp, pretty=False, chunk_size=_CHUNK_SIZE, **kwargs):
+    """Serialize Python objects as JSON directly into the file-like ``fp``
+
+    Arguments are in :func:`json.dump` order; ``fp`` only needs a
+    ``write`` method (e.g. an open file or the result of
+    ``socket.makefile('w')``). See :func:`jsonify_iter`.
+    """
+    chunks = jsonify_iter(data, pretty=pretty, chunk_size=chunk_size, **kwargs)
+    for chunk in chunks:
+        fp.write(chunk)
+
+
+def _decoder_for(ordered):
+    _ensure_backends()
+    return (_ORDERED_DECODERS if ordered else _DECODERS)[0]
 
 
 def jsonexpand(data, ordered=True):
-    if ordered:
-        return json.loads(data, object_pairs_hook=OrderedDict)
-    return json.loads(data)
+    return _decoder_for(ordered).loads(data, ordered)
+
+
+def _read_text(fp, size, decoder):
+    chunk = fp.read(size)
+    if isinstance(chunk, bytes) and bytes is not str:
+        return decoder.decode(chunk, final=not chunk), not chunk
+    return chunk, not chunk
+
+
+def _is_complete(buf, end):
+    # a bare number is only complete once a delimiter follows it
+    if end >= len(buf):
+        return False
+    return buf[end - 1] in '}]"' or buf[end].isspace()
+
+
+def _iter_documents(fp, ordered, chunk_size):
+    """Decode concatenated/newline-delimited documents from buffered reads
+
+    A document is only accepted once it is provably complete (or at EOF) so
+    that a number is never cut at a chunk boundary. The read size grows
+    while a single document spans several chunks to keep parsing linear.
+    """
+    decoder = _decoder_for(ordered).raw_decoder(ordered)
+    textdecoder = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    idx = 0
+    size = chunk_size
+    eof = False
+    while True:
+        idx = _WHITESPACE.match(buf, idx).end()
+        if idx < len(buf):
+            try:
+                obj, end = decoder.raw_decode(buf, idx)
+            except ValueError:
+                if eof:
+                    raise
+                size = max(chunk_size, len(buf) - idx)
+            else:
+                if eof or _is_complete(buf, end):
+                    yield obj
+                    idx = end
+                    size = chunk_size
+                    continue
+        elif eof:
+            return
+        chunk, eof = _read_text(fp, size, textdecoder)
+        buf = buf[idx:] + chunk
+        idx = 0
+
+
+def _iter_lines(fp, chunk_size):
+    textdecoder = codecs.getincrementaldecoder('utf-8')()
+    tail = ''
+    eof = False
+    while not eof:
+        chunk, eof = _read_text(fp, chunk_size, textdecoder)
+        lines = (tail + chunk).split('\n')
+        tail = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line
+    if tail.strip():
+        yield tail
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _expand_batch(args):
+    lines, ordered = args
+    return [jsonexpand(line, ordered=ordered) for line in lines]
+
+
+def jsonexpand_stream(fp, ordered=True, chunk_size=_CHUNK_SIZE,
+                      processes=None, batch_size=_BATCH_SIZE):
+    """Generator decoding one JSON document at a time from file-like ``fp``
+
+    ``fp`` is read in ``chunk_size`` pieces (text or UTF-8 bytes) and may
+    contain newline-delimited or simply concatenated documents. Passing
+    ``processes`` decodes batches of ``batch_size`` records in a process
+    pool while still yielding them in input order, reading at most a few
+    batches per process ahead of the consumer; in that mode records must be
+    newline-delimited (NDJSON).
+    """
+    if not processes:
+        for obj in _iter_documents(fp, ordered, chunk_size):
+            yield obj
+        return
+    batches = _batches(_iter_lines(fp, chunk_size), batch_size)
+    import multiprocessing
+    pool = multiprocessing.Pool(processes)
+    # Pool.imap would read all of fp ahead of the consumer, only keep a
+    # few batches per process in flight
+    window = deque()
+    try:
+        for batch in batches:
+            window.append(
+                pool.apply_async(_expand_batch, ((batch, ordered),)))
+            if len(window) >= _WINDOW * processes:
+                for obj in window.popleft().get():
+                    yield obj
+        while window:
+            for obj in window.popleft().get():
+                yield obj
+        pool.close()
+    finally:
+        pool.terminate()
@@ -4,11 +4,12 @@ from __future__ import absolute_import, unicode_literals
 
 import os
 
-from .boolean import boolean
-from .encoding import UnicodeTransformChar
+from .boolean import boolean, booleans
+from .encoding import UnicodeTransformChar, UnicodeTransformChars
 
 _NOT_PROVIDED = object()
 _ENV_ERROR_MSG = 'Environment variable "{0}" or a default value is required'
+_registry = None
 
 
 def env(key, default=_NOT_PROVIDED, cast=str, force=False, **kwargs):
@@ -23,7 +24,11 @@ def env(key, default=_NOT_PROVIDED, cast=str, force=False, **kwargs):
     :param sticky: injects default into environment so child processes inherit
 
     NOTE: None can be passed as the default to avoid raising a KeyError
+
+    Conversions are cached by :data:`armory.environ.ENV_REGISTRY` and
+    only repeated when the value in the environment changes.
     """
+    global _registry
     boolmap = kwargs.get('boolmap', None)
     sticky = kwargs.get('sticky', False)
 
@@ -37,19 +42,18 @@ def env(key, default=_NOT_PROVIDED, cast=str, force=False, **kwargs):
         except TypeError:
             os.environ[key] = str(value)
 
-    if force or (value != default and type(value) != cast):
-        if cast is bool and boolmap is not None:
-            value = boolean(value, boolmap=boolmap)
-        elif cast is bool:
-            value = boolean(value)
-        else:
-            value = cast(value)
-
-    return value
+    if not force and (value == default or type(value) == cast):
+        return value
+    if _registry is None:
+        # imported lazily, armory.environ imports this module
+        from armory.environ import ENV_REGISTRY as _registry
+    return _registry.convert(key, value, default, cast, force, boolmap)
 
 
 __all__ = (
     'boolean',
+    'booleans',
     'env',
     'UnicodeTransformChar',
+    'UnicodeTransformChars',
 )
@@ -2,6 +2,8 @@
 # -*- encoding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
 
+import sys
+
 from builtins import str
 
 _BOOL_MAP = {
@@ -48,3 +50,94 @@ def boolean(value, boolmap=_BOOL_MAP):
     if result is None:
         result = bool(value)
     return result
+
+
+def _lookup(value, boolmap, lower):
+    """Return ``(result, mapped)`` for one value, as :func:`boolean` would"""
+    key = value.lower() if lower and isinstance(value, str) else value
+    try:
+        result = boolmap.get(key)
+    except TypeError:
+        # unhashable values cannot be in the map
+        result = None
+    if result is None:
+        return bool(value), False
+    return result, True
+
+
+def _booleans_list(values, boolmap, lower):
+    # intern each distinct value so repeated flags are converted once
+    seen = {}
+    results = []
+    unmapped = []
+    for value in values:
+        try:
+            result = seen[value]
+        except KeyError:
+            result = seen[value] = _lookup(value, boolmap, lower)
+        except TypeError:
+            result = _lookup(value, boolmap, lower)
+        results.append(result[0])
+        unmapped.append(not result[1])
+    return results, unmapped
+
+
+def _booleans_array(values, boolmap, lower):
+    np = sys.modules['numpy']
+    pd = sys.modules.get('pandas')
+    flat = values.ravel()
+    try:
+        if pd is not None:
+            codes, uniques = pd.factorize(flat)
+        else:
+            uniques, codes = np.unique(flat, return_inverse=True)
+    except TypeError:
+        # mixed object values that cannot be sorted or hashed
+        results, unmapped = _booleans_list(flat.tolist(), boolmap, lower)
+        return (np.array(results, dtype=bool).reshape(values.shape),
+                np.array(unmapped, dtype=bool).reshape(values.shape))
+    table = [_lookup(value, boolmap, lower) for value in uniques.tolist()]
+    # one extra slot for the missing values pandas codes as -1
+    results = np.array([t[0] for t in table] + [False], dtype=bool)
+    unmapped = np.array([not t[1] for t in table] + [True], dtype=bool)
+    codes = np.asarray(codes).ravel()
+    result = results[codes]
+    mask = unmapped[codes]
+    for i in np.flatnonzero(codes < 0):
+        result[i], mapped = _lookup(flat[i], boolmap, lower)
+        mask[i] = not mapped
+    return result.reshape(values.shape), mask.reshape(values.shape)
+
+
+def booleans(values, boolmap=_BOOL_MAP, mask=False):
+    """
+    Convert many values to <type bool> at once.
+
+    Each distinct value is converted once with the same rules as
+    :func:`boolean`, falling back to the built-in bool conversion for
+    values not in ``boolmap``, and the results are spread back over
+    ``values``. Flag columns usually hold a handful of distinct strings,
+    so this is much faster than calling :func:`boolean` per row.
+
+    ``values`` may be any iterable, a NumPy array or a pandas Series and
+    the result is a list, a bool array of the same shape or a Series
+    sharing the index, respectively. With ``mask`` True a second value of
+    the same kind is returned that is True wherever a value was not in
+    ``boolmap``, so callers can tell true, false and unknown apart.
+    """
+    lower = boolmap == _BOOL_MAP
+    # an array or Series means numpy/pandas are already imported
+    pd = sys.modules.get('pandas')
+    np = sys.modules.get('numpy')
+    if pd is not None and isinstance(values, pd.Series):
+        result, unmapped = _booleans_array(
+            values.to_numpy(dtype=object), boolmap, lower)
+        result = pd.Series(result, index=values.index, name=values.name)
+        unmapped = pd.Series(unmapped, index=values.index, name=values.name)
+    elif np is not None and isinstance(values, np.ndarray):
+        result, unmapped = _booleans_array(values, boolmap, lower)
+    else:
+        result, unmapped = _booleans_list(values, boolmap, lower)
+    if mask:
+        return result, unmapped
+    return result
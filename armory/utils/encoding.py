@@ -1,8 +1,24 @@
 # -*- encoding: utf-8 -*-
 from __future__ import absolute_import
 
+import codecs
+import mmap
 import re
 
+from collections import deque
+
+from builtins import chr
+
+# characters with a meaning in a regex outside of a set
+_SPECIAL = frozenset('.^$*+?{}[]\\|()')
+_CHUNK_SIZE = 1 << 20
+# characters held back at the end of a chunk for matches to complete
+_OVERLAP = 1024
+# encodings that can be split at any byte (besides UTF-8, see _shard_bounds)
+_SINGLE_BYTE = frozenset(['ascii', 'iso8859-1', 'cp1252'])
+# shards in flight per process in transform_stream
+_WINDOW = 2
+
 
 class UnicodeTransformChar(object):
     def __init__(self, char_regex, replacement):
@@ -17,3 +33,304 @@ class UnicodeTransformChar(object):
     def transform(self, text):
         """Replaces characters in string ``text`` based in regex sub"""
         return re.sub(self.regex, self.repl, text)
+
+    def transform_stream(self, fp_in, fp_out, *args, **kwargs):
+        """Replaces characters read from ``fp_in``, writing to ``fp_out``
+
+        See :meth:`UnicodeTransformChars.transform_stream` for the options.
+        """
+        transformer = UnicodeTransformChars([self])
+        transformer.transform_stream(fp_in, fp_out, *args, **kwargs)
+
+
+def _literal_chars(pattern):
+    """Characters matched by a one character or ``[...]`` set pattern
+
+    Returns None for any other pattern.
+    """
+    if len(pattern) == 1:
+        return None if pattern in _SPECIAL else pattern
+    if len(pattern) == 2 and pattern[0] == '\\':
+        return None if pattern[1].isalnum() else pattern[1]
+    if pattern[:1] != '[' or pattern[-1:] != ']' or pattern[1:2] == '^':
+        return None
+    body = pattern[1:-1]
+    if not body or '\\' in body or '[' in body:
+        return None
+    chars = []
+    i = 0
+    while i < len(body):
+        if i + 2 < len(body) and body[i + 1] == '-':
+            start, end = ord(body[i]), ord(body[i + 2])
+            if end < start:
+                return None
+            chars.extend(chr(code) for code in range(start, end + 1))
+            i += 3
+        else:
+            chars.append(body[i])
+            i += 1
+    return ''.join(chars)
+
+
+def _is_literal(repl):
+    return isinstance(repl, type(u'')) and '\\' not in repl
+
+
+def _char_transform(t):
+    """Characters of a plain one character (or set) text transform"""
+    pattern = t.regex.pattern
+    if (not isinstance(pattern, type(u'')) or t.regex.flags & ~re.UNICODE
+            or not _is_literal(t.repl)):
+        return None
+    return _literal_chars(pattern)
+
+
+class _CharTable(object):
+    """A single scan replacing characters through a lookup table"""
+    # str.translate wins over re.sub once this share of characters changes
+    DENSE = 0.125
+    SAMPLE = 4096
+
+    def __init__(self, table):
+        self.table = table
+        self.ordinals = dict((ord(char), repl) for char, repl in table.items())
+        self.regex = re.compile(
+            u'[{0}]'.format(u''.join(re.escape(char) for char in table)))
+        self._lookup = lambda match: table[match.group()]
+
+    def transform(self, text):
+        sample = text[:self.SAMPLE]
+        if len(self.regex.findall(sample)) > len(sample) * self.DENSE:
+            return text.translate(self.ordinals)
+        return self.regex.sub(self._lookup, text)
+
+    def feed(self, text, final=False):
+        return self.transform(text)
+
+
+class _StreamSub(object):
+    """Incremental ``re.sub`` of one transform over chunks of a stream"""
+    def __init__(self, transform, overlap):
+        self.regex = transform.regex
+        repl = transform.repl
+        self.expand = repl if callable(repl) else (lambda m: m.expand(repl))
+        self.overlap = max(overlap, 1)
+        self.context = self.pending = None
+
+    def feed(self, text, final=False):
+        if self.pending is None:
+            self.context = self.pending = text[:0]
+        # the already written context keeps lookbehinds working
+        buffer = self.context + self.pending + text
+        start = pos = len(self.context)
+        size = len(buffer)
+        if not final and size - start < 2 * self.overlap:
+            # too little to commit much; wait for more text
+            self.pending = buffer[start:]
+            return text[:0]
+        safe = size if final else size - self.overlap
+        held = size
+        out = []
+        for match in self.regex.finditer(buffer, start):
+            if not final and match.end() >= safe:
+                # more text could still change this match
+                held = match.start()
+                break
+            out.append(buffer[pos:match.start()])
+            out.append(self.expand(match))
+            pos = match.end()
+        cut = size if final else max(pos, min(held, safe))
+        out.append(buffer[pos:cut])
+        self.context = buffer[max(0, cut - self.overlap):cut]
+        self.pending = buffer[cut:]
+        return text[:0].join(out)
+
+
+def _feed(stages, text, final, decoder, encoding):
+    for stage in stages:
+        text = stage.feed(text, final)
+    return text.encode(encoding) if decoder is not None else text
+
+
+def _mmap(fp):
+    """Memory map regular file ``fp`` for reading, None if it cannot be"""
+    try:
+        return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, IOError, OSError, ValueError):
+        # no file descriptor (io.UnsupportedOperation), a pipe or empty
+        return None
+
+
+def _read_chunks(fp, chunk_size, binary):
+    view = _mmap(fp) if binary else None
+    if view is None:
+        for data in iter(lambda: fp.read(chunk_size), fp.read(0)):
+            yield data
+        return
+    try:
+        start = fp.tell()
+        for offset in range(start, len(view), chunk_size):
+            yield view[offset:offset + chunk_size]
+        fp.seek(len(view))
+    finally:
+        view.close()
+
+
+def _shardable(encoding):
+    name = codecs.lookup(encoding).name
+    return name == 'utf-8' or name in _SINGLE_BYTE
+
+
+def _shard_bounds(view, start, chunk_size):
+    """Byte offsets of ``chunk_size`` shards, at UTF-8 character starts"""
+    bounds = [start]
+    size = len(view)
+    while bounds[-1] < size:
+        end = min(bounds[-1] + chunk_size, size)
+        # never split a multi-byte sequence: skip continuation bytes
+        while end < size and 0x80 <= ord(view[end:end + 1]) < 0xC0:
+            end += 1
+        bounds.append(end)
+    return bounds
+
+
+def _transform_shard(args):
+    transforms, path, start, end, encoding = args
+    with open(path, 'rb') as fp:
+        view = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            data = view[start:end]
+        finally:
+            view.close()
+    transformer = UnicodeTransformChars(transforms)
+    return transformer.transform(data.decode(encoding)).encode(encoding)
+
+
+def _transform_shards(transforms, fp_in, view, fp_out, chunk_size, encoding,
+                      processes):
+    try:
+        bounds = _shard_bounds(view, fp_in.tell(), chunk_size)
+    finally:
+        view.close()
+    tasks = (
+        (transforms, fp_in.name, begin, end, encoding)
+        for begin, end in zip(bounds, bounds[1:])
+    )
+    import multiprocessing
+    pool = multiprocessing.Pool(processes)
+    # Pool.imap would queue every shard and hold their results until
+    # written, only keep a few shards per process in flight
+    window = deque()
+    try:
+        for task in tasks:
+            window.append(pool.apply_async(_transform_shard, (task,)))
+            if len(window) >= _WINDOW * processes:
+                fp_out.write(window.popleft().get())
+        while window:
+            fp_out.write(window.popleft().get())
+        pool.close()
+    finally:
+        pool.terminate()
+    fp_in.seek(bounds[-1])
+
+
+class UnicodeTransformChars(object):
+    def __init__(self, transforms):
+        """Initializes with many transforms applied in as few scans as possible
+
+        ``transforms`` are :class:`UnicodeTransformChar` instances or
+        ``(char_regex, replacement)`` pairs. Consecutive transforms of one
+        character (or a ``[...]`` set of them) to plain text are merged
+        into a single lookup table applied in one scan, with
+        ``str.translate`` or one character class regex depending on how
+        many characters change. Other patterns keep a scan of their own,
+        as a merged alternation is slower to match than separate scans.
+
+        The result is the same as applying the transforms one after the
+        other: a merged transform also applies to the replacements of the
+        earlier ones in its table, and where patterns overlap the earlier
+        one wins.
+        """
+        self.transforms = [
+            t if isinstance(t, UnicodeTransformChar)
+            else UnicodeTransformChar(*t)
+            for t in transforms
+        ]
+        scans = []
+        for t in self.transforms:
+            chars = _char_transform(t)
+            if chars is None:
+                scans.append(t)
+                continue
+            if not scans or not isinstance(scans[-1], dict):
+                scans.append({})
+            table = scans[-1]
+            for char, repl in table.items():
+                # chained, this transform also rewrites earlier output
+                if any(c in chars for c in repl):
+                    table[char] = u''.join(
+                        t.repl if c in chars else c for c in repl)
+            for char in chars:
+                table.setdefault(char, t.repl)
+        self._scans = [
+            _CharTable(scan) if isinstance(scan, dict) else scan
+            for scan in scans
+        ]
+
+    @property
+    def scans(self):
+        """Number of passes over the text :func:`transform` makes"""
+        return len(self._scans)
+
+    def transform(self, text):
+        """Applies every transform to string ``text``"""
+        for scan in self._scans:
+            text = scan.transform(text)
+        return text
+
+    def transform_stream(self, fp_in, fp_out, chunk_size=_CHUNK_SIZE,
+                         encoding='utf-8', overlap=_OVERLAP, processes=None):
+        """Applies every transform to file-like ``fp_in``, into ``fp_out``
+
+        Works a ``chunk_size`` piece at a time and writes exactly what
+        :func:`transform` would for the whole input. Binary input (which
+        is memory-mapped when it is a regular file) is decoded from and
+        written back in ``encoding``, unless the patterns are bytes.
+
+        Text near the end of a chunk is held back until the next one, so
+        matches straddling a boundary are found as long as a match plus
+        any lookahead or lookbehind spans at most ``overlap`` characters.
+
+        With ``processes``, a UTF-8 or single byte encoded regular file is
+        split into ``chunk_size`` shards transformed in a process pool and
+        written in order. Only transforms merged into lookup tables (see
+        :class:`UnicodeTransformChars`) can be sharded, as they need no
+        context; other transforms are streamed in this process.
+        """
+        text = any(
+            isinstance(t.regex.pattern, type(u'')) for t in self.transforms)
+        empty = fp_in.read(0)
+        binary = isinstance(empty, bytes)
+        if processes and text and binary and all(
+                isinstance(scan, _CharTable) for scan in self._scans):
+            view = _mmap(fp_in)
+            if view is not None and _shardable(encoding):
+                _transform_shards(
+                    self.transforms, fp_in, view, fp_out, chunk_size,
+                    encoding, processes)
+                return
+            if view is not None:
+                view.close()
+        stages = [
+            scan if isinstance(scan, _CharTable) else _StreamSub(scan, overlap)
+            for scan in self._scans
+        ]
+        decoder = None
+        if text and binary:
+            decoder = codecs.getincrementaldecoder(encoding)()
+        for data in _read_chunks(fp_in, chunk_size, binary):
+            if decoder is not None:
+                data = decoder.decode(data)
+            fp_out.write(_feed(stages, data, False, decoder, encoding))
+        data = decoder.decode(b'', True) if decoder is not None else empty
+        fp_out.write(_feed(stages, data, True, decoder, encoding))
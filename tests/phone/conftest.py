@@ -0,0 +1,143 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import json
+import threading
+import time
+
+import pytest
+
+try:
+    import socketserver
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from urllib.parse import parse_qs, urlparse
+except ImportError:
+    import SocketServer as socketserver
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from urlparse import parse_qs, urlparse
+
+LOOKUP_PAGE = (
+    '<html><head><meta name="csrfToken" content="token"></head><body>'
+    '<input type="hidden" role="visitorSid" value="sid"></body></html>'
+)
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: no TLS or AUTH"""
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        sender = None
+        rcpts = []
+        self.reply('220 stub ESMTP')
+        for line in self.rfile:
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+            arg = command.partition(':')[2].strip().strip('<>')
+            if verb == 'EHLO':
+                self.reply('250-stub')
+                self.reply('250-8BITMIME')
+                self.reply('250 SMTPUTF8')
+            elif verb in ('HELO', 'NOOP', 'RSET'):
+                self.reply('250 ok')
+            elif verb == 'MAIL':
+                sender, rcpts = arg.split()[0] if arg else '', []
+                self.reply('250 ok')
+            elif verb == 'RCPT':
+                if arg in server.refused:
+                    self.reply('550 no such user')
+                else:
+                    rcpts.append(arg)
+                    self.reply('250 ok')
+            elif verb == 'DATA':
+                self.reply('354 go ahead')
+                data = []
+                for line in self.rfile:
+                    if line == b'.\r\n':
+                        break
+                    data.append(line)
+                with server.lock:
+                    server.messages.append((sender, rcpts, b''.join(data)))
+                self.reply('250 queued')
+            elif verb == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('502 not implemented')
+
+
+class _SMTPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+@pytest.fixture
+def smtp_server():
+    """Local SMTP stub; ``.messages`` holds ``(sender, rcpts, data)``"""
+    server = _SMTPServer(('127.0.0.1', 0), _SMTPHandler)
+    server.messages = []
+    server.refused = set()
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class _LookupHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body, cookie=False):
+        self.send_response(200)
+        if cookie:
+            self.send_header('Set-Cookie', 'session=1')
+        self.send_header('Content-Length', '{0}'.format(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._send(LOOKUP_PAGE.encode('utf-8'), cookie=True)
+
+    def do_POST(self):
+        number = parse_qs(urlparse(self.path).query)['PhoneNumber'][0]
+        with self.server.lock:
+            self.server.lookups.append(number)
+        time.sleep(self.server.latency)
+        body = {
+            'success': True,
+            'body': {
+                'national_format': '({0}) {1}-{2}'.format(
+                    number[:3], number[3:6], number[6:]),
+                'carrier': {'name': 'Verizon Wireless', 'type': 'mobile'},
+            },
+        }
+        self._send(json.dumps(body).encode('utf-8'))
+
+
+class _LookupServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def lookup_host():
+    """Local stand-in for the carrier lookup host
+
+    ``.lookups`` lists the numbers posted, each answered after
+    ``.latency`` seconds.
+    """
+    server = _LookupServer(('127.0.0.1', 0), _LookupHandler)
+    server.lookups = []
+    server.lock = threading.Lock()
+    server.latency = 0
+    server.url = 'http://{0}:{1}'.format(*server.server_address)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,97 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import smtplib
+
+import pytest
+
+aiosmtplib = pytest.importorskip('aiosmtplib')
+
+from armory.phone import aio  # noqa: E402
+
+
+class PlainEmailSMS(aio.AsyncEmailSMS):
+    """Connects to the stub without STARTTLS or AUTH"""
+    connections = 0
+
+    async def _connect(self):
+        host, _, port = self._server.partition(':')
+        smtp = aiosmtplib.SMTP(
+            hostname=host, port=int(port), start_tls=False)
+        await smtp.connect()
+        self.connections += 1
+        return smtp
+
+
+def client(server, **kwargs):
+    address = '{0}:{1}'.format(*server.server_address)
+    return PlainEmailSMS(address, 'me@x.com', 'secret', **kwargs)
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, 10))
+
+
+def test_refused_recipients_are_not_retried(smtp_server):
+    smtp_server.refused.add('5555550001@vtext.com')
+    recipients = ['5555550000@vtext.com', '5555550001@vtext.com']
+
+    async def send():
+        async with client(smtp_server, concurrency=1) as sms:
+            results = await sms.send_many(recipients, 'hello', retries=3)
+            return results, sms.connections
+    results, connections = run(send())
+    assert [r.ok for r in results] == [True, False]
+    assert isinstance(results[1].error, aiosmtplib.SMTPRecipientsRefused)
+    assert results[1].attempts == 1
+    # the refusal did not cost the connection
+    assert connections == 1
+    assert len(smtp_server.messages) == 1
+
+
+def test_long_messages_are_segmented(smtp_server):
+    message = ' '.join('word{0}'.format(i) for i in range(60))
+
+    async def send():
+        async with client(smtp_server) as sms:
+            await sms.send('5555550000@vtext.com', message)
+            return await sms.send_many(['5555550001@vtext.com'], message)
+    results = run(send())
+    assert results[0].ok
+    parts = [data for _, rcpts, data in smtp_server.messages
+             if rcpts == ['5555550001@vtext.com']]
+    assert len(parts) > 1
+    assert len(smtp_server.messages) == 2 * len(parts)
+    assert parts[0].startswith('(1/{0}) '.format(len(parts)).encode())
+
+
+def test_default_port_is_smtp(monkeypatch):
+    ports = []
+
+    class SMTP(object):
+        def __init__(self, hostname, port, start_tls):
+            ports.append(port)
+
+        async def connect(self):
+            pass
+
+        async def login(self, username, passcode):
+            pass
+    monkeypatch.setattr(aio.aiosmtplib, 'SMTP', SMTP)
+    sms = aio.AsyncEmailSMS('smtp.example.com', 'me@x.com', 'secret')
+    run(sms._connect())
+    assert ports == [smtplib.SMTP_PORT]
+
+
+def test_non_ascii_messages_are_sent_as_utf8(smtp_server):
+    from email import message_from_string
+
+    async def send():
+        async with client(smtp_server) as sms:
+            return await sms.send_many(['5555550000@vtext.com'], 'señor')
+    results = run(send())
+    assert results[0].ok
+    data = smtp_server.messages[0][2].decode('ascii')
+    body = message_from_string(data).get_payload(decode=True)
+    assert body.decode('utf-8') == 'señor'
@@ -0,0 +1,89 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import time
+
+import pytest
+
+from armory.phone import lookup as lookup_module
+from armory.phone.cache import LookupCache
+from armory.phone.service import PhoneService
+from armory.phone.store import PhoneCache
+
+
+class Remote(object):
+    """Stand-in for carrier_lookup counting the remote lookups"""
+    def __init__(self, fail=()):
+        self.calls = []
+        self.fail = fail
+
+    def __call__(self, number, *args):
+        self.calls.append(number)
+        if number in self.fail:
+            raise ValueError('no such number')
+        return {
+            'success': True,
+            'body': {'carrier': {'name': 'Verizon', 'type': 'mobile'}},
+        }
+
+
+def test_memory_disk_and_negative_tiers(tmpdir):
+    remote = Remote(fail=['5555550199'])
+    path = str(tmpdir.join('lookups.log'))
+    first = LookupCache(path, lookup=remote)
+    first.lookup('5555550100')
+    first.lookup('5555550100')
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            first.lookup('5555550199')
+    assert first.stats()['hits'] == 2
+    assert first.stats()['negative_hits'] == 1
+    first.close()
+    second = LookupCache(path, lookup=remote)
+    second.lookup('5555550100')
+    with pytest.raises(ValueError):
+        second.lookup('5555550199')
+    assert second.stats()['disk_hits'] == 2
+    second.close()
+    assert remote.calls == ['5555550100', '5555550199']
+
+
+def test_fresh_entries_from_other_processes_are_seen(tmpdir):
+    remote = Remote()
+    path = str(tmpdir.join('lookups.log'))
+    first = LookupCache(path, ttl=0.3, lookup=remote)
+    second = LookupCache(path, ttl=0.3, lookup=remote)
+    first.lookup('5555550100')
+    second.lookup('5555550100')
+    time.sleep(0.4)
+    # the first process looks it up again after the entry expired, the
+    # second one must pick up that fresh entry instead of its stale one
+    first.lookup('5555550100')
+    second.lookup('5555550100')
+    assert remote.calls == ['5555550100'] * 2
+    assert second.stats()['disk_hits'] == 2
+    first.close()
+    second.close()
+
+
+def test_service_lookups_share_the_lookup_cache(tmpdir, monkeypatch):
+    remote = Remote(fail=['5555550199'])
+    monkeypatch.setattr(lookup_module, 'carrier_lookup', remote)
+    path = str(tmpdir.join('lookups.log'))
+    numbers = ['5555550100', '5555550101', '5555550199']
+    calls = []
+    for name in ('a', 'b'):
+        service = PhoneService(
+            PhoneCache(str(tmpdir.join(name + '.log'))),
+            lookup_cache=LookupCache(path, lookup=remote))
+        result = service.lookup('5555550100', cache=False)
+        assert result['data']['body']['carrier']['name'] == 'Verizon'
+        results = service.lookup_many(numbers, cache=False)
+        errors = dict((r['number'], r['error']) for r in results)
+        assert errors['5555550101'] is None
+        assert 'no such number' in errors['5555550199']
+        service.close()
+        calls.append(len(remote.calls))
+    assert sorted(set(remote.calls)) == numbers
+    # the second service (process) made no remote lookup at all
+    assert calls[0] == calls[1]
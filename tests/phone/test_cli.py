@@ -0,0 +1,75 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import io
+import json
+import os
+
+import pytest
+
+click_testing = pytest.importorskip('click.testing')
+
+from armory.phone.cli import CLI  # noqa: E402
+from armory.phone.store import PhoneCache  # noqa: E402
+
+LEGACY = {
+    'lookups': {'5555550100': {'comment': 'me', 'sms': 'x@vtext.com'}},
+    'smtp_login': {'server': 'a', 'username': 'user', 'passcode': 'pass'},
+}
+
+
+def write_legacy(path):
+    with io.open(path, 'w', encoding='utf-8') as fp:
+        fp.write(json.dumps(LEGACY, indent=2))
+
+
+def read(path):
+    with io.open(path, 'r', encoding='utf-8') as fp:
+        return fp.read()
+
+
+@pytest.mark.parametrize('args, legacy, log', [
+    (['-c', 'old.json'], 'old.json', 'old.json.log'),
+    ([], '.phonecache', '.phonecache.log'),
+])
+def test_legacy_config_is_migrated_not_appended_to(
+        args, legacy, log, tmpdir, monkeypatch):
+    monkeypatch.chdir(str(tmpdir))
+    write_legacy(legacy)
+    before = read(legacy)
+    runner = click_testing.CliRunner()
+    for server in ('b', 'c'):
+        result = runner.invoke(CLI, args + ['config', '-s', server])
+        assert result.exit_code == 0, result.output
+    assert read(legacy) == before
+    with PhoneCache(log) as cache:
+        assert cache.settings['smtp_login'] == {
+            'server': 'c', 'username': 'user', 'passcode': 'pass'}
+        assert cache.lookups['5555550100']['comment'] == 'me'
+
+
+def test_config_names_the_log(tmpdir, monkeypatch):
+    monkeypatch.chdir(str(tmpdir))
+    runner = click_testing.CliRunner()
+    result = runner.invoke(CLI, ['-c', 'my.log', 'config', '-s', 'b'])
+    assert result.exit_code == 0, result.output
+    assert not os.path.exists('my.log.log')
+    with PhoneCache('my.log') as cache:
+        assert cache.settings['smtp_login']['server'] == 'b'
+
+
+def test_failed_recipients_are_logged_once(tmpdir, monkeypatch, caplog):
+    monkeypatch.chdir(str(tmpdir))
+    with PhoneCache('phone.log') as cache:
+        # nothing listens on port 1
+        cache.settings['smtp_login'] = {
+            'server': '127.0.0.1:1', 'username': 'u', 'passcode': 'p'}
+        cache.lookups['5555550100'] = {'sms': '5555550100@vtext.com'}
+    runner = click_testing.CliRunner()
+    result = runner.invoke(
+        CLI, ['-c', 'phone.log', 'sms', '-n', '5555550100', '-m', 'hi'])
+    assert result.exit_code == 0, result.output
+    failures = [r for r in caplog.records
+                if 'failed to send to' in r.getMessage()]
+    assert len(failures) == 1
+    assert '5555550100@vtext.com' in failures[0].getMessage()
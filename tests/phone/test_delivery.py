@@ -0,0 +1,90 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import smtplib
+import socket
+import threading
+
+from armory.phone.delivery import SMTPPool, group_recipients
+
+
+def connector(server):
+    def connect():
+        return smtplib.SMTP(*server.server_address)
+    return connect
+
+
+def deliver(pool, messages, timeout=10):
+    """``pool.deliver(messages)`` that fails the test instead of hanging"""
+    outcome = []
+    thread = threading.Thread(
+        target=lambda: outcome.append(pool.deliver(messages)))
+    thread.daemon = True
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), 'SMTPPool.deliver did not return'
+    return outcome[0]
+
+
+def test_deliver_over_pooled_connections(smtp_server):
+    recipients = ['55555500{0:02d}@vtext.com'.format(i) for i in range(20)]
+    pool = SMTPPool(connector(smtp_server), size=2, max_messages=5)
+    report = deliver(pool, [('me@x.com', r, 'hello') for r in recipients])
+    assert sorted(r.recipient for r in report.sent) == recipients
+    assert not report.failed
+    assert len(smtp_server.messages) == 20
+    assert 4 <= report.connections <= 6
+
+
+def test_refused_recipients_fail_alone(smtp_server):
+    smtp_server.refused.add('5555550001@vtext.com')
+    groups = group_recipients(
+        ['5555550000@vtext.com', '5555550001@vtext.com'])
+    pool = SMTPPool(connector(smtp_server), size=1)
+    report = deliver(pool, [('me@x.com', g, 'hello') for g in groups])
+    assert [r.recipient for r in report.sent] == ['5555550000@vtext.com']
+    assert [r.recipient for r in report.failed] == ['5555550001@vtext.com']
+
+
+def test_unexpected_errors_fail_the_message(smtp_server):
+    messages = [('me@x.com', 'a@vtext.com', 'hello')] * 10
+    messages.insert(3, ('me@x.com', 'b@vtext.com', object()))
+    pool = SMTPPool(connector(smtp_server), size=1)
+    report = deliver(pool, messages)
+    assert len(report.sent) == 10
+    assert [r.recipient for r in report.failed] == ['b@vtext.com']
+
+
+def test_connection_errors_do_not_hang(smtp_server):
+    def connect():
+        raise RuntimeError('no route')
+    pool = SMTPPool(connect, size=1, backoff=0)
+    report = deliver(pool, [('me@x.com', 'a@vtext.com', 'hello')] * 10)
+    assert len(report.failed) == 10
+    assert all(isinstance(r.error, RuntimeError) for r in report.failed)
+
+
+def test_non_ascii_messages_are_sent_as_utf8(smtp_server):
+    from email import message_from_string
+    pool = SMTPPool(connector(smtp_server), size=1)
+    parts = ('(1/2) café ', '(2/2) señor')
+    report = deliver(pool, [('me@x.com', 'a@vtext.com', parts)])
+    assert len(report.sent) == 1
+    bodies = [
+        message_from_string(data.decode('ascii')).get_payload(decode=True)
+        for _, _, data in smtp_server.messages
+    ]
+    assert [body.decode('utf-8') for body in bodies] == list(parts)
+
+
+def test_connections_are_reused_until_closed(smtp_server):
+    pool = SMTPPool(connector(smtp_server), size=1)
+    assert len(deliver(pool, [('me@x.com', 'a@vtext.com', 'hi')]).sent) == 1
+    report = deliver(pool, [('me@x.com', 'a@vtext.com', 'hi')])
+    assert len(report.sent) == 1 and report.connections == 0
+    # a connection dropped while idle is replaced
+    pool._idle[0][0].sock.shutdown(socket.SHUT_RDWR)
+    report = deliver(pool, [('me@x.com', 'a@vtext.com', 'hi')])
+    assert len(report.sent) == 1 and report.connections == 1
+    pool.close()
+    assert not pool._idle
@@ -0,0 +1,54 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import logging
+
+import pytest
+
+from armory.phone.gateways import get_resolver, load_gateways, parse_gateways
+
+
+@pytest.mark.parametrize('carrier, key', [
+    ('Verizon Wireless', 'Verizon'),
+    ('Cellco Partnership dba Verizon Wireless', 'Verizon'),
+    ('New Cingular Wireless PCS, LLC', 'Cingular (Now AT&T)'),
+    ('AT&T Wireless', 'AT&T'),
+    ('T-Mobile USA, Inc.', 'T-Mobile'),
+    ('Sprint Spectrum, L.P.', 'Sprint'),
+    ('Metro PCS Wireless, Inc.', 'Metro PCS'),
+    ('Virgin Mobile USA', 'Virgin Mobile'),
+    ('US Cellular Corp', 'US Cellular'),
+    ('Verizn Wireless', 'Verizon'),
+    ('Wireless', None),
+    ('Cellular', None),
+    ('Canada', None),
+    ('', None),
+])
+def test_resolve_carrier_names(carrier, key):
+    assert get_resolver().resolve(carrier) == key
+
+
+def test_parse_gateways_on_one_or_two_lines():
+    text = (
+        'Verizon 10digitphonenumber@vtext.com\n'
+        '\n'
+        'T-Mobile\n'
+        '10digitphonenumber@tmomail.net\n'
+        'Cricket   \n'
+        '  @sms.cricketwireless.net\n'
+        'not a gateway line\n'
+    )
+    assert parse_gateways(text) == {
+        'Verizon': '@vtext.com',
+        'T-Mobile': '@tmomail.net',
+        'Cricket': '@sms.cricketwireless.net',
+    }
+
+
+def test_empty_override_file_warns(tmpdir, caplog):
+    path = tmpdir.join('gateways.txt')
+    path.write('Verizon: vtext.com\n')
+    with caplog.at_level(logging.WARNING, logger='armory.phone.gateways'):
+        table = load_gateways(str(path))
+    assert table == load_gateways()
+    assert 'no carrier gateways found' in caplog.text
@@ -0,0 +1,32 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+HEAVY = ('requests', 'bs4', 'simplejson', 'smtplib')
+
+
+def imported(module):
+    """Top level packages imported by ``import module``, from -X importtime"""
+    output = subprocess.check_output(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        stderr=subprocess.STDOUT, env=os.environ.copy())
+    names = set()
+    for line in output.decode('utf-8').splitlines():
+        if line.startswith('import time:') and '|' in line:
+            name = line.rsplit('|', 1)[1].strip()
+            names.add(name.split('.')[0])
+    return names
+
+
+@pytest.mark.parametrize('module', [
+    'armory.phone', 'armory.phone.cli', 'armory.serialize',
+])
+def test_heavy_modules_are_deferred(module):
+    names = imported(module)
+    assert module.split('.')[0] in names
+    assert not names.intersection(HEAVY)
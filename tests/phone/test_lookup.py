@@ -0,0 +1,74 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import threading
+import time
+
+import pytest
+
+from armory.phone import lookup
+
+NUMBERS = ['55555500{0:02d}'.format(i) for i in range(20)]
+
+
+def consume(iterable, timeout=10):
+    """``list(iterable)`` that fails the test instead of hanging"""
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = list(iterable)
+        except Exception as e:
+            outcome['error'] = e
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), 'lookup_many did not finish'
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['result']
+
+
+def test_lookup_many_against_stub_host(lookup_host):
+    results = consume(lookup.lookup_many(
+        NUMBERS, concurrency=4, host=lookup_host.url))
+    assert sorted(number for number, _, _ in results) == NUMBERS
+    assert all(error is None for _, _, error in results)
+    info = dict((number, info) for number, info, _ in results)
+    assert info['5555550003']['body']['national_format'] == '(555) 555-0003'
+
+
+def test_lookup_many_reports_unexpected_errors(monkeypatch):
+    def carrier_lookup(number, logname=None, host=None):
+        if number == NUMBERS[3]:
+            raise RuntimeError('boom')
+        return {'number': number}
+    monkeypatch.setattr(lookup, 'carrier_lookup', carrier_lookup)
+    results = consume(lookup.lookup_many(NUMBERS, concurrency=2))
+    assert len(results) == len(NUMBERS)
+    errors = dict((number, error) for number, _, error in results if error)
+    assert list(errors) == [NUMBERS[3]]
+    assert isinstance(errors[NUMBERS[3]], RuntimeError)
+
+
+def test_lookup_many_reraises_iterable_errors(monkeypatch):
+    monkeypatch.setattr(
+        lookup, 'carrier_lookup', lambda number, *args: {'number': number})
+
+    def numbers():
+        for number in NUMBERS[:5]:
+            yield number
+        raise ValueError('bad input file')
+    with pytest.raises(ValueError):
+        consume(lookup.lookup_many(numbers(), concurrency=2))
+
+
+def test_closing_lookup_many_stops_the_workers(lookup_host):
+    lookup_host.latency = 0.2
+    results = lookup.lookup_many(NUMBERS, concurrency=2, host=lookup_host.url)
+    next(results)
+    results.close()
+    time.sleep(1)
+    # the lookups already posted finish, no new ones are started
+    assert len(lookup_host.lookups) <= 4
@@ -0,0 +1,68 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import pytest
+
+from armory.phone.normalize import normalize_number, normalize_numbers
+
+VALUES = [
+    '5555550100',
+    '(555) 555-0101',
+    ' 555-555-0102 ',
+    '555 555 0103',
+    '555.555.0104',
+    '+1 555 555 0105',
+    '15555550106',
+    '555555010',
+    '55555501077',
+    '',
+    '   ',
+    '(555)555-01O8',
+    '５５５５５５０１０９',
+    '555\t555\t0110',
+    '555-555-0111\n',
+]
+MIXED = VALUES + [None, 5555550112, 5.5, b'5555550113', ['5555550114']]
+
+
+def expected(values):
+    numbers = []
+    for value in values:
+        try:
+            numbers.append(normalize_number(value))
+        except (ValueError, AttributeError, TypeError):
+            numbers.append('')
+    return numbers, [not number for number in numbers]
+
+
+@pytest.mark.parametrize('values', [VALUES, MIXED, []])
+def test_list_matches_normalize_number(values):
+    assert normalize_numbers(values) == expected(values)
+    assert normalize_numbers(iter(values)) == expected(values)
+
+
+@pytest.mark.parametrize('values', [VALUES, MIXED, []])
+def test_array_matches_normalize_number(values):
+    np = pytest.importorskip('numpy')
+    array = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        array[i] = value
+    arrays = [array]
+    if values is VALUES:
+        arrays.append(np.array(values))
+    for array in arrays:
+        numbers, rejected = normalize_numbers(array)
+        assert isinstance(numbers, np.ndarray)
+        assert numbers.tolist() == expected(values)[0]
+        assert rejected.tolist() == expected(values)[1]
+
+
+def test_series_matches_normalize_number():
+    pd = pytest.importorskip('pandas')
+    series = pd.Series(MIXED, index=range(10, 10 + len(MIXED)),
+                       name='phone')
+    numbers, rejected = normalize_numbers(series)
+    assert numbers.tolist() == expected(MIXED)[0]
+    assert rejected.tolist() == expected(MIXED)[1]
+    assert numbers.index.equals(series.index)
+    assert rejected.name == 'phone'
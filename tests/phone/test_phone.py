@@ -0,0 +1,38 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import smtplib
+
+from email import message_from_string
+
+from armory.phone.phone import EmailSMS
+
+
+class PlainEmailSMS(EmailSMS):
+    """Connects to the stub without STARTTLS or AUTH"""
+    def _connect(self):
+        return smtplib.SMTP(*self._server)
+
+
+def bodies(server):
+    return [
+        message_from_string(data.decode('ascii')).get_payload(decode=True)
+        .decode('utf-8')
+        for _, _, data in server.messages
+    ]
+
+
+def test_send_non_ascii_message(smtp_server):
+    message = 'Grüße aus Köln ' * 20
+    with PlainEmailSMS(smtp_server.server_address, 'me@x.com', '') as sms:
+        sms.send('5555550000@vtext.com', message)
+    parts = bodies(smtp_server)
+    assert len(parts) > 1
+    assert ''.join(part.split(') ', 1)[1] for part in parts) == message
+
+
+def test_send_many_non_ascii_message(smtp_server):
+    sms = PlainEmailSMS(smtp_server.server_address, 'me@x.com', '')
+    report = sms.send_many(['5555550000@vtext.com'], 'señor')
+    assert len(report.sent) == 1
+    assert bodies(smtp_server) == ['señor']
@@ -0,0 +1,35 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+from armory.phone.phonebook import PhoneBook
+
+
+def test_views_survive_additions():
+    book = PhoneBook()
+    for i in range(0, 10, 2):
+        book.add('55555500{0:02d}'.format(i), carrier='even')
+    view = book.get('5555550008')
+    for i in range(1, 10, 2):
+        book.add('55555500{0:02d}'.format(i), carrier='odd')
+    assert view.number == '5555550008'
+    assert view.carrier == 'even'
+    assert len(book) == 10
+    assert view.carrier == 'even'
+
+
+def test_views_see_replaced_entries():
+    book = PhoneBook()
+    book.add('5555550001', carrier='old')
+    view = book.get('5555550001')
+    book.add('5555550001', carrier='new')
+    assert view.carrier == 'new'
+    assert len(book) == 1
+
+
+def test_contains_rejects_invalid_input():
+    book = PhoneBook()
+    book.add('5555550001')
+    assert '(555) 555-0001' in book
+    assert '555' not in book
+    assert None not in book
+    assert 3.5 not in book
@@ -0,0 +1,64 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import re
+
+import pytest
+
+from armory.phone.segment import (
+    GSM7, UCS2, SMS_LIMITS, segment_boundaries, segment_message,
+    sms_encoding, sms_length,
+)
+
+PREFIX = re.compile(r'^\((\d+)/(\d+)\) ')
+
+
+def unsegment(parts):
+    return ''.join(PREFIX.sub('', part) for part in parts)
+
+
+@pytest.mark.parametrize('text, encoding, length', [
+    ('hello', GSM7, 5),
+    ('price: 5€ [net]', GSM7, 18),
+    ('naïve café', UCS2, 10),
+    ('ok \U0001F600', UCS2, 5),
+])
+def test_encoding_and_length(text, encoding, length):
+    assert sms_encoding(text) == encoding
+    assert sms_length(text) == length
+
+
+def test_short_messages_are_not_split():
+    text = 'x' * SMS_LIMITS[GSM7]
+    assert segment_message(text) == [text]
+
+
+@pytest.mark.parametrize('text', [
+    ' '.join('word{0}'.format(i) for i in range(100)),
+    '{' * 200,
+    'ünïcödé text ' * 20,
+    '\U0001F600' * 50,
+    'x' * 2000,
+])
+def test_parts_fit_and_reassemble(text):
+    parts = segment_message(text)
+    assert len(parts) > 1
+    encoding = sms_encoding(text)
+    limit = SMS_LIMITS[encoding]
+    for i, part in enumerate(parts, 1):
+        assert PREFIX.match(part).groups() == (
+            '{0}'.format(i), '{0}'.format(len(parts)))
+        assert sms_length(part, encoding) <= limit
+    assert unsegment(parts) == text
+
+
+def test_parts_prefer_to_end_at_whitespace():
+    text = ' '.join('word{0}'.format(i) for i in range(100))
+    for start, end in segment_boundaries(text)[:-1]:
+        assert text[end - 1] == ' '
+
+
+def test_surrogate_pairs_are_never_split():
+    text = 'a' + '\U0001F600' * 100
+    for start, end in segment_boundaries(text):
+        assert not 0xDC00 <= ord(text[start]) <= 0xDFFF
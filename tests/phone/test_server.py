@@ -0,0 +1,88 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import json
+import logging
+import threading
+
+import pytest
+
+from armory.phone.server import PhoneServer
+
+try:
+    from http.client import HTTPConnection
+except ImportError:
+    from httplib import HTTPConnection
+
+
+class Service(object):
+    log = logging.getLogger(__name__)
+
+    def ping(self):
+        return 'pong'
+
+    def list_lookups(self):
+        return []
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def http_port(tmpdir):
+    server = PhoneServer(Service(), str(tmpdir.join('phone.sock')),
+                         http_port=0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    while server.http_port == 0:
+        thread.join(0.01)
+    yield server.http_port
+    server.shutdown()
+    thread.join(5)
+
+
+def request(port, method, path, headers, body=None):
+    conn = HTTPConnection('127.0.0.1', port, timeout=5)
+    conn.putrequest(method, path, skip_host=True)
+    for name, value in headers.items():
+        conn.putheader(name, value)
+    body = body.encode('utf-8') if body is not None else b''
+    conn.putheader('Content-Length', '{0}'.format(len(body)))
+    conn.endheaders(body)
+    response = conn.getresponse()
+    status, data = response.status, response.read()
+    conn.close()
+    return status, data
+
+
+def test_json_post_from_localhost(http_port):
+    for host in ('127.0.0.1', 'localhost'):
+        headers = {'Host': '{0}:{1}'.format(host, http_port),
+                   'Content-Type': 'application/json; charset=utf-8'}
+        status, data = request(http_port, 'POST', '/ping', headers, '{}')
+        assert status == 200
+        assert json.loads(data.decode('utf-8'))['result'] == 'pong'
+
+
+@pytest.mark.parametrize('host, ctype, status', [
+    ('evil.example', 'application/json', 403),
+    ('127.0.0.1', 'application/json', 403),
+    ('127.0.0.1:{port}', 'text/plain', 415),
+    ('127.0.0.1:{port}', None, 415),
+    (None, 'application/json', 403),
+])
+def test_foreign_requests_are_refused(http_port, host, ctype, status):
+    headers = {}
+    if host is not None:
+        headers['Host'] = host.format(port=http_port)
+    if ctype is not None:
+        headers['Content-Type'] = ctype
+    assert request(http_port, 'POST', '/sms', headers, '{}')[0] == status
+
+
+def test_get_checks_the_host(http_port):
+    headers = {'Host': 'evil.example:{0}'.format(http_port)}
+    assert request(http_port, 'GET', '/lookups', headers)[0] == 403
+    headers = {'Host': '127.0.0.1:{0}'.format(http_port)}
+    assert request(http_port, 'GET', '/lookups', headers)[0] == 200
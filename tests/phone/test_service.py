@@ -0,0 +1,49 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import smtplib
+
+import pytest
+
+from armory.phone.phone import EmailSMS
+from armory.phone.service import PhoneService
+from armory.phone.store import PhoneCache
+
+
+@pytest.fixture
+def service(tmpdir, smtp_server, monkeypatch):
+    """A service with two cached numbers and SMTP set up for the stub"""
+    connections = []
+
+    def connect(self):
+        smtp = smtplib.SMTP(self._server)
+        connections.append(smtp)
+        return smtp
+    monkeypatch.setattr(EmailSMS, '_connect', connect)
+    cache = PhoneCache(str(tmpdir.join('phone.db')))
+    cache.settings['smtp_login'] = {
+        'server': '{0}:{1}'.format(*smtp_server.server_address),
+        'username': 'me@x.com',
+        'passcode': 'secret',
+    }
+    for number in ('5555550000', '5555550001'):
+        cache.lookups[number] = {'sms': number + '@vtext.com'}
+    service = PhoneService(cache)
+    service.connections = connections
+    yield service
+    service.close()
+
+
+def test_send_all_keeps_the_pool_warm(service, smtp_server):
+    for _ in range(3):
+        result = service.sms('hello', send_all=True, connections=1)
+        assert sorted(result['sent']) == [
+            '5555550000@vtext.com', '5555550001@vtext.com']
+    assert len(smtp_server.messages) == 3
+    assert len(service.connections) == 1
+
+
+def test_non_ascii_sms_is_sent(service, smtp_server):
+    result = service.sms('señor', numbers=['5555550000'])
+    assert result['sent'] == ['5555550000@vtext.com']
+    assert not result['failed']
@@ -0,0 +1,138 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import io
+import json
+import multiprocessing
+
+import pytest
+
+from armory.phone.store import LogStore, PhoneCache, migrate_json
+
+WRITES = 60
+
+
+def write_many(path, name, autocompact):
+    with LogStore(path, autocompact=autocompact) as store:
+        for i in range(WRITES):
+            # a few keys written over and over, so compactions kick in
+            store['{0}-{1}'.format(name, i % 5)] = {'writer': name, 'i': i}
+
+
+def compact_with_updates(path):
+    with LogStore(path, autocompact=0) as store:
+        for i in range(20):
+            store['shared'] = i
+        store['new'] = 'value'
+        del store['gone']
+        store.compact()
+
+
+def run(target, *args):
+    process = multiprocessing.Process(target=target, args=args)
+    process.start()
+    process.join(60)
+    assert process.exitcode == 0
+
+
+def lines(path):
+    with io.open(path, 'rb') as fp:
+        return fp.read().split(b'\n')
+
+
+def test_values_survive_reopening(tmpdir):
+    path = str(tmpdir.join('store.log'))
+    with LogStore(path) as store:
+        store['a'] = {'x': [1, 2]}
+        store['b'] = 'text'
+        store['a'] = 'replaced'
+        del store['b']
+        assert store.stale == 3
+    with LogStore(path) as store:
+        assert dict(store.items()) == {'a': 'replaced'}
+        with pytest.raises(ValueError):
+            store['c'] = None
+
+
+def test_concurrent_writers_with_autocompaction(tmpdir):
+    path = str(tmpdir.join('store.log'))
+    names = ['w{0}'.format(i) for i in range(4)]
+    processes = [
+        multiprocessing.Process(target=write_many, args=(path, name, 5))
+        for name in names
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+    with LogStore(path) as store:
+        assert len(store) == len(names) * 5
+        for name in names:
+            for i in range(WRITES - 5, WRITES):
+                assert store['{0}-{1}'.format(name, i % 5)] == {
+                    'writer': name, 'i': i}
+    # autocompaction kept the log from growing to every write
+    assert len(lines(path)) - 1 < len(names) * WRITES // 2
+
+
+def test_torn_tail_is_cut_off_by_the_next_writer(tmpdir, caplog):
+    path = str(tmpdir.join('store.log'))
+    with LogStore(path) as store:
+        store['a'] = 1
+        store['b'] = 2
+    with io.open(path, 'ab') as fp:
+        # a writer crashed half way through its record
+        fp.write(b'"c"\t{"half": ')
+    with LogStore(path) as store:
+        assert dict(store.items()) == {'a': 1, 'b': 2}
+        assert 'incomplete record' in caplog.text
+        store['d'] = 4
+        assert store['d'] == 4
+    assert lines(path) == [b'"a"\t1', b'"b"\t2', b'"d"\t4', b'']
+    with LogStore(path) as store:
+        assert dict(store.items()) == {'a': 1, 'b': 2, 'd': 4}
+
+
+def test_reader_reindexes_after_another_process_compacts(tmpdir):
+    path = str(tmpdir.join('store.log'))
+    reader = LogStore(path)
+    reader['shared'] = 'old'
+    reader['gone'] = 'soon'
+    assert reader['shared'] == 'old'
+    run(compact_with_updates, path)
+    # the reader's offsets point into the replaced file
+    assert reader['shared'] == 19
+    assert 'new' in reader
+    assert 'gone' not in reader
+    assert reader.stale == 0
+    reader['after'] = True
+    reader.close()
+    with LogStore(path) as store:
+        assert dict(store.items()) == {
+            'shared': 19, 'new': 'value', 'after': True}
+
+
+def test_migrate_json(tmpdir):
+    legacy = str(tmpdir.join('legacy.json'))
+    data = {
+        'lookups': {
+            '5555550100': {'comment': 'me', 'body': {'carrier': {}}},
+            '5555550101': {'comment': 'you'},
+        },
+        'smtp_login': {'server': 'smtp', 'username': 'u', 'passcode': 'p'},
+        'sms_gateways': None,
+    }
+    with io.open(legacy, 'w', encoding='utf-8') as fp:
+        fp.write(json.dumps(data))
+    with PhoneCache(str(tmpdir.join('cache.log'))) as cache:
+        assert migrate_json(legacy, cache) == 2
+        assert dict(cache.lookups.items()) == data['lookups']
+        assert dict(cache.settings.items()) == {
+            'smtp_login': data['smtp_login']}
+        assert cache.store.stale == 0
+    empty = str(tmpdir.join('empty.json'))
+    io.open(empty, 'w').close()
+    with PhoneCache(str(tmpdir.join('other.log'))) as cache:
+        assert migrate_json(empty, cache) == 0
+        assert len(cache.lookups) == 0
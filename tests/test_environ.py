@@ -0,0 +1,165 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import io
+import sys
+import threading
+
+import pytest
+
+from armory.environ import Environment, load_env, read_dotenv
+from armory import utils
+
+DOTENV = '''\
+# settings
+export A=plain value # note
+B="x\\ny" # note
+C='literal \\n # kept'
+D="quote \\" inside"
+E=
+F="#not a comment"
+'''
+
+
+def test_read_dotenv(tmpdir):
+    path = str(tmpdir.join('.env'))
+    with io.open(path, 'w', encoding='utf-8') as fp:
+        fp.write(DOTENV)
+    assert read_dotenv(path) == {
+        'A': 'plain value',
+        'B': 'x\ny',
+        'C': 'literal \\n # kept',
+        'D': 'quote " inside',
+        'E': '',
+        'F': '#not a comment',
+    }
+
+
+def test_load_env_reports_every_error():
+    schema = {
+        'A': {'coerce': int},
+        'B': {'coerce': int},
+        'C': {},
+        'D': {'default': 'd'},
+    }
+    values, errors = load_env(schema, {'A': '1', 'B': 'x'})
+    assert values == {'A': 1, 'D': 'd'}
+    assert sorted(errors) == ['B', 'C']
+    assert isinstance(errors['B'], ValueError)
+    assert isinstance(errors['C'], KeyError)
+
+
+SPEC = {
+    'HOST': {'default': 'localhost'},
+    'PORT': {'default': 80, 'coerce': int},
+    'DEBUG': {'default': False, 'coerce': bool},
+    'TOKEN': {},
+}
+
+
+def test_environment_coerces_once_into_a_snapshot():
+    env = Environment(SPEC, {'PORT': '8080', 'DEBUG': 'yes', 'TOKEN': 't'})
+    assert env('HOST') == 'localhost'
+    assert env.PORT == 8080
+    assert env('DEBUG') is True
+    assert env.TOKEN == 't'
+    assert env.errors == {}
+    assert env.version == 1
+    with pytest.raises(AttributeError):
+        env.snapshot.PORT = 1
+    with pytest.raises(KeyError):
+        env('OTHER')
+    with pytest.raises(AttributeError):
+        env.OTHER
+
+
+def test_environment_raises_collected_errors():
+    env = Environment(SPEC, {'PORT': 'x'})
+    assert sorted(env.errors) == ['PORT', 'TOKEN']
+    with pytest.raises(ValueError):
+        env('PORT')
+    with pytest.raises(KeyError):
+        env('TOKEN')
+    assert env.HOST == 'localhost'
+
+
+def test_environment_reload_reports_changes():
+    environ = {'TOKEN': 'a'}
+    env = Environment(SPEC, environ)
+    assert env.reload() == frozenset()
+    assert env.version == 1
+    environ.update(TOKEN='b', PORT='81')
+    assert env.changed() == frozenset(['TOKEN', 'PORT'])
+    assert env.TOKEN == 'a'
+    assert env.reload() == frozenset(['TOKEN', 'PORT'])
+    assert (env.TOKEN, env.PORT, env.version) == ('b', 81, 2)
+    assert env.changed() == frozenset()
+    del environ['TOKEN']
+    env.reload()
+    with pytest.raises(KeyError):
+        env('TOKEN')
+
+
+def test_environment_readers_never_see_a_partial_reload():
+    good = {'PORT': '1', 'TOKEN': 't'}
+    bad = {'PORT': 'x'}
+    environ = dict(good)
+    env = Environment(SPEC, environ)
+    failures = []
+    done = threading.Event()
+
+    def read():
+        while not done.is_set():
+            try:
+                port = env('PORT')
+            except ValueError:
+                continue
+            except KeyError as e:
+                failures.append(e)
+            else:
+                if port != 1:
+                    failures.append(port)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    interval = sys.getswitchinterval()
+    # switch threads as often as possible to hit any torn read
+    sys.setswitchinterval(1e-6)
+    for thread in readers:
+        thread.start()
+    try:
+        for i in range(2000):
+            environ.clear()
+            environ.update(bad if i % 2 else good)
+            env.reload()
+    finally:
+        done.set()
+        for thread in readers:
+            thread.join()
+        sys.setswitchinterval(interval)
+    assert failures == []
+
+
+def test_utils_env_caches_conversions(monkeypatch):
+    calls = []
+
+    def cast(value):
+        calls.append(value)
+        return int(value)
+
+    monkeypatch.setenv('ARMORY_TEST_ENV', '5')
+    assert utils.env('ARMORY_TEST_ENV', cast=cast) == 5
+    assert utils.env('ARMORY_TEST_ENV', cast=cast) == 5
+    assert calls == ['5']
+    monkeypatch.setenv('ARMORY_TEST_ENV', '6')
+    assert utils.env('ARMORY_TEST_ENV', cast=cast) == 6
+    assert utils.env('ARMORY_TEST_ENV', cast=int, force=True) == 6
+    assert calls == ['5', '6']
+    monkeypatch.setenv('ARMORY_TEST_ENV', 'no')
+    assert utils.env('ARMORY_TEST_ENV', cast=bool) is False
+    boolmap = {'no': True}
+    assert utils.env('ARMORY_TEST_ENV', cast=bool, boolmap=boolmap) is True
+    monkeypatch.delenv('ARMORY_TEST_ENV')
+    assert utils.env('ARMORY_TEST_ENV', '7', cast=int) == '7'
+    assert utils.env('ARMORY_TEST_ENV', '7', cast=int, force=True) == 7
+    with pytest.raises(KeyError):
+        utils.env('ARMORY_TEST_ENV')
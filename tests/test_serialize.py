@@ -0,0 +1,230 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import io
+import os
+import subprocess
+import sys
+
+from collections import OrderedDict, namedtuple
+from decimal import Decimal
+
+import pytest
+
+from armory.serialize import jsonify, jsonify_iter, jsonify_to
+
+Point = namedtuple('Point', 'x y')
+
+
+class Tagged(list):
+    def for_json(self):
+        return {'tagged': list(self)}
+
+
+PAYLOADS = [
+    {},
+    [],
+    'text',
+    42,
+    None,
+    {'b': 1, 'a': [1, 2.5, None, True], 'c': {'z': 'ünïcode', 'y': []}},
+    OrderedDict([('b', 1), ('a', OrderedDict([('z', 1), ('y', 2)]))]),
+    [{'number': '{0:010d}'.format(i), 'carrier': {'name': 'Verizon'}}
+     for i in range(500)],
+    {'point': Point(1, 2), 'tagged': Tagged([1]), 'price': Decimal('1.10'),
+     'complex': 1j},
+]
+
+
+@pytest.mark.parametrize('data', PAYLOADS)
+@pytest.mark.parametrize('pretty', [False, True])
+@pytest.mark.parametrize('chunk_size', [1, 7, 64 * 1024])
+def test_jsonify_iter_matches_jsonify(data, pretty, chunk_size):
+    chunks = list(jsonify_iter(data, pretty=pretty, chunk_size=chunk_size))
+    assert ''.join(chunks) == jsonify(data, pretty=pretty)
+    assert all(chunks)
+    if chunk_size > 1:
+        # chunks are coalesced to about chunk_size characters
+        assert all(len(chunk) >= chunk_size for chunk in chunks[:-1])
+
+
+@pytest.mark.parametrize('data', PAYLOADS)
+@pytest.mark.parametrize('pretty', [False, True])
+def test_jsonify_to_matches_jsonify(data, pretty):
+    fp = io.StringIO()
+    jsonify_to(data, fp, pretty=pretty, chunk_size=16)
+    assert fp.getvalue() == jsonify(data, pretty=pretty)
+
+
+def test_pretty_keeps_ordered_dicts_in_order():
+    data = OrderedDict([('b', 1), ('a', 2)])
+    assert ''.join(jsonify_iter(data, pretty=True)) == (
+        '{\n  "b": 1,\n  "a": 2\n}')
+    assert ''.join(jsonify_iter(dict(data), pretty=True)) == (
+        '{\n  "a": 2,\n  "b": 1\n}')
+
+
+# the contract every backend is held to: simplejson's output
+CONFORMANCE = [
+    {'b': 1, 'a': [1, 2.5, -0.0, 1e300, None, True, False]},
+    {'text': 'ünïcode   "quoted" \\ \x00 \U0001F600'},
+    {'big': 2 ** 70, 'neg': -(2 ** 64), 'nested': [[[]], {}, [{}]]},
+    OrderedDict([('z', 1), ('a', OrderedDict([('y', 2), ('b', 3)]))]),
+    ['{0}'.format(i) for i in range(100)],
+]
+
+
+def backends(capability):
+    from armory.serialize import get_backends
+    return [b for b in get_backends() if getattr(b, capability)]
+
+
+@pytest.mark.parametrize('data', CONFORMANCE)
+@pytest.mark.parametrize('pretty', [False, True])
+def test_backends_encode_like_simplejson(data, pretty):
+    simplejson = pytest.importorskip('simplejson')
+    from armory.serialize import StdlibJSONBackend, _jsonify_params
+    params = _jsonify_params(data, pretty, {})
+    expected = simplejson.dumps(data, ensure_ascii=False, **params)
+    assert jsonify(data, pretty=pretty) == expected
+    # the stdlib backend encodes when simplejson is missing
+    for backend in backends('encodes') + [StdlibJSONBackend()]:
+        assert backend.dumps(data, ensure_ascii=False, **params) == expected
+        chunks = backend.iterencode(data, ensure_ascii=False, **params)
+        assert ''.join(chunks) == expected
+
+
+@pytest.mark.parametrize('data', CONFORMANCE)
+@pytest.mark.parametrize('ordered', [False, True])
+def test_backends_decode_like_simplejson(data, ordered):
+    simplejson = pytest.importorskip('simplejson')
+    from armory.serialize import jsonexpand
+    text = simplejson.dumps(data)
+    hook = {'object_pairs_hook': OrderedDict} if ordered else {}
+    expected = simplejson.loads(text, **hook)
+    assert jsonexpand(text, ordered=ordered) == expected
+    for backend in backends('decodes'):
+        result = backend.loads(text, ordered)
+        assert result == expected
+        assert type(result) is type(expected)
+        if ordered and isinstance(expected, dict):
+            assert list(result) == list(expected)
+
+
+def test_stdlib_rejects_what_simplejson_rejects():
+    simplejson = pytest.importorskip('simplejson')
+    from armory.serialize import StdlibJSONBackend, jsonexpand
+    backend = StdlibJSONBackend()
+    for text in ['NaN', '[Infinity]', '{"a": 1,}', '[1] x']:
+        with pytest.raises(ValueError):
+            simplejson.loads(text, allow_nan=False)
+        with pytest.raises(ValueError):
+            backend.loads(text)
+        with pytest.raises(ValueError):
+            jsonexpand(text)
+    with pytest.raises(ValueError):
+        jsonify(float('nan'))
+
+
+def test_without_simplejson():
+    """The stdlib takes over encoding, with simplejson's output"""
+    script = (
+        'import sys; sys.modules["simplejson"] = None\n'
+        'from collections import OrderedDict\n'
+        'from decimal import Decimal\n'
+        'from armory import serialize\n'
+        'assert serialize.simplejson is None\n'
+        'data = OrderedDict([("b", [1, 2.5]), ("a", Decimal("1.5"))])\n'
+        'print(serialize.jsonify(data, pretty=True))\n'
+        'print("".join(serialize.jsonify_iter(data)))\n'
+        'print(list(serialize.jsonexpand("{\\"b\\": 1, \\"a\\": 2}")))\n'
+    )
+    output = subprocess.check_output(
+        [sys.executable, '-c', script], env=os.environ.copy())
+    assert output.decode('utf-8').splitlines() == [
+        '{', '  "b": [', '    1,', '    2.5', '  ],', '  "a": 1.5', '}',
+        '{"b": [1, 2.5], "a": 1.5}',
+        "['b', 'a']",
+    ]
+
+
+class CountingReader(object):
+    def __init__(self, data):
+        self._fp = io.BytesIO(data)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return self._fp.read(size)
+
+
+def ndjson(count):
+    line = '{{"number": "{0:010d}", "carrier": {{"name": "Verizon"}}}}\n'
+    return ''.join(line.format(i) for i in range(count)).encode('utf-8')
+
+
+@pytest.mark.parametrize('processes', [None, 2])
+def test_jsonexpand_stream(processes):
+    from armory.serialize import jsonexpand_stream
+    data = ndjson(2500)
+    records = list(jsonexpand_stream(
+        io.BytesIO(data), chunk_size=100, processes=processes,
+        batch_size=100))
+    assert [r['number'] for r in records] == [
+        '{0:010d}'.format(i) for i in range(2500)]
+
+
+def test_jsonexpand_stream_processes_read_ahead_is_bounded():
+    from armory.serialize import jsonexpand_stream
+    data = ndjson(20000)
+    fp = CountingReader(data)
+    line = len(data) // 20000
+    records = jsonexpand_stream(
+        fp, chunk_size=1024, processes=2, batch_size=100)
+    assert next(records)['number'] == '0000000000'
+    # the window of 2 batches per process plus the batch being read
+    limit = (2 * 2 + 1) * 100 * line // 1024 + 2
+    assert fp.reads <= limit
+    assert sum(1 for _ in records) == 19999
+    assert fp.reads > 10 * limit
+
+
+def test_schema_cache_matches_jsonify():
+    from armory.serialize import SchemaCache
+    cache = SchemaCache()
+    for data in PAYLOADS + CONFORMANCE:
+        for pretty in (False, True):
+            assert cache.jsonify(data, pretty=pretty) == jsonify(
+                data, pretty=pretty)
+    assert cache.jsonify({'a': 1}, sort_keys=True) == '{"a": 1}'
+
+
+def test_schema_cache_hits_and_misses():
+    from armory.serialize import SchemaCache
+    cache = SchemaCache()
+    for i in range(200):
+        # distinct key sets and value types share one plan
+        cache.jsonify({'key{0}'.format(i): i if i % 2 else 'text'})
+    assert cache.info() == (199, 1, 128, 1)
+    cache.jsonify({'a': 1}, pretty=True)
+    cache.jsonify(OrderedDict([('b', 1), ('a', 2)]), pretty=True)
+    cache.jsonify(OrderedDict([('b', 1)]))
+    assert cache.info() == (200, 3, 128, 3)
+    cache.clear()
+    assert cache.info() == (0, 0, 128, 0)
+
+
+def test_schema_cache_evicts_least_recently_used():
+    from armory.serialize import SchemaCache
+    cache = SchemaCache(maxsize=2)
+    ordered = OrderedDict([('b', 1), ('a', 2)])
+    cache.jsonify({'a': 1})
+    cache.jsonify({'a': 1}, pretty=True)
+    cache.jsonify({'a': 1})
+    # evicts the pretty plan, used less recently than the compact one
+    assert cache.jsonify(ordered, pretty=True) == jsonify(ordered, True)
+    assert cache.info() == (1, 3, 2, 2)
+    cache.jsonify({'a': 1})
+    assert cache.info().hits == 2
+    cache.jsonify({'a': 1}, pretty=True)
+    assert cache.info() == (2, 4, 2, 2)
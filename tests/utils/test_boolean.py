@@ -0,0 +1,80 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import pytest
+
+from armory.utils import boolean, booleans
+from armory.utils.boolean import _BOOL_MAP
+
+DEFAULT = ['y', 'Yes', 'TRUE', 't', '1', 'n', 'No', 'false', 'F', '0',
+           '', 'maybe', ' yes', 'on']
+MIXED = DEFAULT + [1, 0, 2, 1.0, 0.0, True, False, None, float('nan'),
+                   b'yes', ('y',), ['y'], [], {}]
+ONOFF = {'on': True, 'off': False, 0: True}
+
+
+def expected(values, boolmap=None):
+    """``boolean`` item by item and whether each item was in the map"""
+    lower = boolmap is None
+    boolmap = _BOOL_MAP if boolmap is None else boolmap
+    results = []
+    unmapped = []
+    for value in values:
+        try:
+            results.append(boolean(value, boolmap=boolmap))
+        except TypeError:
+            # unhashable, boolean() cannot look it up
+            results.append(bool(value))
+        key = value.lower() if lower and isinstance(value, type('')) else (
+            value)
+        try:
+            unmapped.append(key not in boolmap)
+        except TypeError:
+            unmapped.append(True)
+    return results, unmapped
+
+
+@pytest.mark.parametrize('values', [DEFAULT, MIXED, DEFAULT * 50, []])
+def test_list_matches_boolean(values):
+    assert booleans(values, mask=True) == expected(values)
+    assert booleans(iter(values)) == expected(values)[0]
+    assert booleans(values, ONOFF, mask=True) == expected(values, ONOFF)
+
+
+@pytest.mark.parametrize('values', [DEFAULT, MIXED, DEFAULT * 50, []])
+def test_array_matches_boolean(values):
+    np = pytest.importorskip('numpy')
+    arrays = [np.fromiter(values, dtype=object, count=len(values))]
+    if values and values is not MIXED:
+        # a 2-d text array
+        arrays.append(np.array(values).reshape(2, -1))
+    for array in arrays:
+        for boolmap in (None, ONOFF):
+            args = (array,) if boolmap is None else (array, boolmap)
+            result, unmapped = booleans(*args, mask=True)
+            assert result.dtype == bool and unmapped.dtype == bool
+            assert result.shape == array.shape
+            values = array.ravel().tolist()
+            assert result.ravel().tolist() == expected(values, boolmap)[0]
+            assert unmapped.ravel().tolist() == expected(values, boolmap)[1]
+
+
+def test_numeric_array_matches_boolean():
+    np = pytest.importorskip('numpy')
+    array = np.array([0, 1, 2, 0, 1])
+    assert booleans(array).tolist() == [False, True, True, False, True]
+    result, unmapped = booleans(array, ONOFF, mask=True)
+    assert result.tolist() == [True, True, True, True, True]
+    assert unmapped.tolist() == [False, True, True, False, True]
+
+
+@pytest.mark.parametrize('values', [DEFAULT, MIXED])
+def test_series_matches_boolean(values):
+    pd = pytest.importorskip('pandas')
+    series = pd.Series(values, index=range(5, 5 + len(values)), name='flag',
+                       dtype=object)
+    result, unmapped = booleans(series, mask=True)
+    assert result.tolist() == expected(values)[0]
+    assert unmapped.tolist() == expected(values)[1]
+    assert result.index.equals(series.index)
+    assert unmapped.name == 'flag'
@@ -0,0 +1,141 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+import io
+import multiprocessing
+import random
+
+from armory.utils import UnicodeTransformChar, UnicodeTransformChars
+
+ALPHABET = 'abcdeé '
+PATTERNS = ('a', 'b', 'é', ' ', '[a-c]', '[de]', '[bé ]', 'ab', 'c+', r'\s')
+
+
+def chained(transforms, text):
+    for t in transforms:
+        text = UnicodeTransformChar(*t).transform(text)
+    return text
+
+
+def random_text(rng, size):
+    return ''.join(rng.choice(ALPHABET) for _ in range(size))
+
+
+def random_transforms(rng):
+    return [
+        (rng.choice(PATTERNS), random_text(rng, rng.randint(0, 3)))
+        for _ in range(rng.randint(1, 6))
+    ]
+
+
+def test_chained_one_char_transforms():
+    transformer = UnicodeTransformChars([('a', 'b'), ('b', 'c')])
+    assert transformer.scans == 1
+    assert transformer.transform('ab') == 'cc'
+    transformer = UnicodeTransformChars([('a', 'bb'), ('[b-c]', 'cd')])
+    assert transformer.transform('abc') == 'cdcdcdcd'
+
+
+def test_transform_matches_chained_transforms():
+    rng = random.Random(24)
+    for _ in range(500):
+        transforms = random_transforms(rng)
+        transformer = UnicodeTransformChars(transforms)
+        text = random_text(rng, rng.randint(0, 40))
+        assert transformer.transform(text) == chained(transforms, text), (
+            transforms, text)
+
+
+# multi-byte characters test shard and chunk boundaries
+STREAM_TEXT = ''.join(
+    random.Random(25).choice(ALPHABET + 'xyE€𝄞') for _ in range(2000))
+TABLES = [('é', 'e'), ('[a-c]', 'x'), ('€', 'EUR'), ('𝄞', '')]
+MIXED = TABLES + [('xx', 'y'), (r'(?<=y)d', 'D'), ('E+', 'e')]
+CHUNK_SIZES = (1, 3, 7, 64)
+
+
+def stream(transforms, fp_in, fp_out, **kwargs):
+    UnicodeTransformChars(transforms).transform_stream(
+        fp_in, fp_out, **kwargs)
+    return fp_out.getvalue()
+
+
+def test_transform_stream_matches_transform(tmpdir):
+    path = str(tmpdir.join('input.txt'))
+    with io.open(path, 'w', encoding='utf-8') as fp:
+        fp.write(STREAM_TEXT)
+    for transforms in (TABLES, MIXED):
+        expected = UnicodeTransformChars(transforms).transform(STREAM_TEXT)
+        for chunk_size in CHUNK_SIZES:
+            text = stream(
+                transforms, io.StringIO(STREAM_TEXT), io.StringIO(),
+                chunk_size=chunk_size)
+            assert text == expected
+            data = stream(
+                transforms, io.BytesIO(STREAM_TEXT.encode('utf-8')),
+                io.BytesIO(), chunk_size=chunk_size)
+            assert data == expected.encode('utf-8')
+            with open(path, 'rb') as fp:
+                # a regular file, memory-mapped
+                data = stream(
+                    transforms, fp, io.BytesIO(), chunk_size=chunk_size)
+            assert data == expected.encode('utf-8')
+
+
+def test_transform_stream_in_processes(tmpdir):
+    path = str(tmpdir.join('input.txt'))
+    with io.open(path, 'w', encoding='utf-8') as fp:
+        fp.write(STREAM_TEXT)
+    expected = UnicodeTransformChars(TABLES).transform(STREAM_TEXT)
+    for chunk_size in (7, 64):
+        with open(path, 'rb') as fp:
+            data = stream(
+                TABLES, fp, io.BytesIO(), chunk_size=chunk_size,
+                processes=2)
+            assert fp.tell() == len(STREAM_TEXT.encode('utf-8'))
+        assert data == expected.encode('utf-8')
+
+
+class RecordingPool(object):
+    """Runs tasks in process, recording how many results are pending"""
+    def __init__(self, processes):
+        self.pending = self.most = 0
+        pools.append(self)
+
+    def apply_async(self, func, args):
+        self.pending += 1
+        self.most = max(self.most, self.pending)
+        return RecordedResult(self, func(*args))
+
+    def close(self):
+        pass
+
+    def terminate(self):
+        pass
+
+
+class RecordedResult(object):
+    def __init__(self, pool, value):
+        self.pool = pool
+        self.value = value
+
+    def get(self):
+        self.pool.pending -= 1
+        return self.value
+
+
+pools = []
+
+
+def test_transform_stream_bounds_shards_in_flight(tmpdir, monkeypatch):
+    path = str(tmpdir.join('input.txt'))
+    with io.open(path, 'w', encoding='utf-8') as fp:
+        fp.write(STREAM_TEXT)
+    monkeypatch.setattr(multiprocessing, 'Pool', RecordingPool)
+    del pools[:]
+    with open(path, 'rb') as fp:
+        data = stream(TABLES, fp, io.BytesIO(), chunk_size=16, processes=2)
+    expected = UnicodeTransformChars(TABLES).transform(STREAM_TEXT)
+    assert data == expected.encode('utf-8')
+    assert pools[0].pending == 0
+    assert pools[0].most == 2 * 2